@@ -0,0 +1,163 @@
+"""
+Compiled inner loops for signal_detector
+Numba is optional; without it NUMBA_AVAILABLE is False and the detector
+keeps to its NumPy implementation
+"""
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that returns the function uncompiled"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True)
+def _trend_at(px, i, window_size, stability_points, threshold):
+    """
+    Check whether point i is a stable trend against the mean of the
+    window_size points before it
+    
+    Returns:
+        (is_trend, window mean, percent change)
+    """
+    n = len(px)
+    
+    # Window baseline, summed left to right so it matches the NumPy path
+    # bit for bit (a running sum drifts in the last bits and flips exact
+    # ties in the stability check)
+    window_sum = px[i - window_size]
+    for k in range(i - window_size + 1, i):
+        window_sum += px[k]
+    window_mean = window_sum / window_size
+    
+    if window_mean == 0:
+        return False, window_mean, 0.0
+    
+    price_change = px[i] - window_mean
+    percent_change = price_change / window_mean
+    
+    if abs(percent_change) < threshold:
+        return False, window_mean, percent_change
+    
+    # Trend must hold for the next few points (as many as there are)
+    up = price_change > 0
+    half_change = percent_change * 0.5
+    for j in range(i + 1, min(i + stability_points + 1, n)):
+        future_change = (px[j] - window_mean) / window_mean
+        if (up and future_change < half_change) or (not up and future_change > half_change):
+            return False, window_mean, percent_change
+    
+    return True, window_mean, percent_change
+
+
+@njit(cache=True)
+def _detect_trends_loop(px, window_size, stability_points, threshold):
+    """
+    Scan a price series for sustained trends in one pass
+    
+    Args:
+        px: Contiguous float64 prices in timestamp order
+        window_size: Number of points in the rolling baseline window
+        stability_points: Points after a trend that must not reverse it
+        threshold: Minimum relative change from the window mean
+    
+    Returns:
+        Arrays of trend indices, their window means and percent changes
+    """
+    n = len(px)
+    idx = np.empty(n, dtype=np.int64)
+    means = np.empty(n, dtype=np.float64)
+    changes = np.empty(n, dtype=np.float64)
+    count = 0
+    
+    # Track last detected trend to avoid duplicates for same trend; the gap
+    # is checked first since it is cheapest (only a full trend moves it)
+    last_trend_idx = -1
+    min_gap = window_size // 2
+    last = min(n - stability_points, n - 1)
+    
+    for i in range(window_size, last + 1):
+        if i - last_trend_idx < min_gap:
+            continue
+        
+        is_trend, window_mean, percent_change = _trend_at(px, i, window_size, stability_points, threshold)
+        if not is_trend:
+            continue
+        
+        last_trend_idx = i
+        idx[count] = i
+        means[count] = window_mean
+        changes[count] = percent_change
+        count += 1
+    
+    return idx[:count], means[:count], changes[:count]
+
+
+@njit(cache=True)
+def _detect_all(px, threshold, window_size, stability_points, trend_threshold):
+    """
+    Scan a price series for alerts and trends in the same pass, so each
+    price is loaded once for both detectors
+    
+    Args:
+        px: Contiguous float64 prices in timestamp order
+        threshold: Minimum relative change between neighbours for an alert
+        window_size: Number of points in the rolling baseline window
+        stability_points: Points after a trend that must not reverse it
+        trend_threshold: Minimum relative change from the window mean
+    
+    Returns:
+        Alert indices (of the later point) and percent changes, then trend
+        indices, window means and percent changes
+    """
+    n = len(px)
+    alert_idx = np.empty(n, dtype=np.int64)
+    alert_changes = np.empty(n, dtype=np.float64)
+    alert_count = 0
+    trend_idx = np.empty(n, dtype=np.int64)
+    trend_means = np.empty(n, dtype=np.float64)
+    trend_changes = np.empty(n, dtype=np.float64)
+    trend_count = 0
+    
+    last_trend_idx = -1
+    min_gap = window_size // 2
+    
+    # Trends need a full window plus the stability points
+    if n < window_size + stability_points:
+        last = window_size - 1
+    else:
+        last = min(n - stability_points, n - 1)
+    
+    for i in range(1, n):
+        prior = px[i - 1]
+        if prior != 0:
+            change = (px[i] - prior) / prior
+            if abs(change) >= threshold:
+                alert_idx[alert_count] = i
+                alert_changes[alert_count] = change
+                alert_count += 1
+        
+        if i < window_size or i > last or i - last_trend_idx < min_gap:
+            continue
+        
+        is_trend, window_mean, percent_change = _trend_at(px, i, window_size, stability_points, trend_threshold)
+        if not is_trend:
+            continue
+        
+        last_trend_idx = i
+        trend_idx[trend_count] = i
+        trend_means[trend_count] = window_mean
+        trend_changes[trend_count] = percent_change
+        trend_count += 1
+    
+    return (
+        alert_idx[:alert_count], alert_changes[:alert_count],
+        trend_idx[:trend_count], trend_means[:trend_count], trend_changes[:trend_count]
+    )
@@ -30,7 +30,7 @@ def show_event_markets(collector, event_slug):
     """Show all markets for an event"""
     # Get event
     event_result = collector.supabase.table('polymarket_events')\
-        .select('*')\
+        .select('id, title, event_type')\
         .eq('event_slug', event_slug)\
         .execute()
     
@@ -11,8 +11,10 @@ import logging
 from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Any, Optional
 import time
+import numpy as np
 import requests
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,6 +26,9 @@ SUPABASE_URL = os.environ.get('SUPABASE_URL')
 SUPABASE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
 CLOB_API_BASE = 'https://clob.polymarket.com'
 
+# PostgREST/Postgres codes for a function that doesn't exist
+MISSING_FUNCTION_CODES = {'PGRST202', '42883'}
+
 def get_supabase_client() -> Client:
     """Initialize and return Supabase client"""
     if not SUPABASE_URL or not SUPABASE_KEY:
@@ -42,6 +47,7 @@ class PolymarketPriceCollector:
             'User-Agent': 'PolymarketPriceCollector/1.0'
         })
         self.fidelity = 1  # 1 = minute data
+        self.last_ts_rpc_available = True
     
     def get_tracked_markets_with_tokens(self) -> List[Dict[str, Any]]:
         """Get tracked markets with their token IDs"""
@@ -85,17 +91,42 @@ class PolymarketPriceCollector:
             return []
     
     def get_last_price_timestamp(self, token_id: str) -> Optional[datetime]:
-        """Get the timestamp of the last stored price for a token"""
+        """
+        Get the timestamp of the last stored price for a token.
+        
+        Uses the get_last_ts RPC, which returns only max(timestamp) via an
+        index-only scan on (token_id, timestamp):
+        
+            CREATE FUNCTION get_last_ts(tid text) RETURNS timestamptz
+            LANGUAGE sql STABLE AS $$
+                SELECT max(timestamp) FROM polymarket_price_history WHERE token_id = tid
+            $$;
+        
+        If the function isn't deployed, falls back to fetching the latest row
+        for the rest of the run; any other RPC error is logged and None returned.
+        """
         try:
-            response = self.supabase.table('polymarket_price_history')\
-                .select('timestamp')\
-                .eq('token_id', token_id)\
-                .order('timestamp', desc=True)\
-                .limit(1)\
-                .execute()
+            timestamp_str = None
+            if self.last_ts_rpc_available:
+                try:
+                    response = self.supabase.rpc('get_last_ts', {'tid': token_id}).execute()
+                    timestamp_str = response.data
+                except APIError as e:
+                    if e.code not in MISSING_FUNCTION_CODES:
+                        raise
+                    self.last_ts_rpc_available = False
+                    logger.warning(f"get_last_ts RPC not deployed, falling back to latest-row queries: {e.message}")
             
-            if response.data:
-                timestamp_str = response.data[0]['timestamp']
+            if not self.last_ts_rpc_available:
+                response = self.supabase.table('polymarket_price_history')\
+                    .select('timestamp')\
+                    .eq('token_id', token_id)\
+                    .order('timestamp', desc=True)\
+                    .limit(1)\
+                    .execute()
+                timestamp_str = response.data[0]['timestamp'] if response.data else None
+            
+            if timestamp_str:
                 # Parse ISO format timestamp
                 return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
             
@@ -187,15 +218,20 @@ class PolymarketPriceCollector:
             return 0
         
         try:
+            # Format all timestamps in one vectorized pass (epoch seconds -> ISO UTC)
+            epochs = np.fromiter((entry['t'] for entry in price_data), dtype=np.int64, count=len(price_data))
+            iso_timestamps = np.datetime_as_string(epochs.astype('datetime64[s]'), unit='s', timezone='UTC').tolist()
+            
             # Prepare records for insertion
-            records = []
-            for entry in price_data:
-                records.append({
+            records = [
+                {
                     'condition_id': condition_id,
                     'token_id': token_id,
-                    'timestamp': datetime.fromtimestamp(entry['t'], tz=timezone.utc).isoformat(),
+                    'timestamp': ts,
                     'price': float(entry['p']) if entry.get('p') is not None else None
-                })
+                }
+                for ts, entry in zip(iso_timestamps, price_data)
+            ]
             
             # Batch insert (Supabase handles upsert with unique constraint)
             # Insert in chunks of 1000 to avoid payload limits
@@ -229,6 +265,16 @@ class PolymarketPriceCollector:
         # Get last stored timestamp
         last_timestamp = self.get_last_price_timestamp(token_id)
         
+        # Skip the CLOB fetch entirely if the stored data is fresher than one
+        # fidelity interval plus some slack - no new minute bar can exist yet
+        if last_timestamp and datetime.now(timezone.utc) - last_timestamp < timedelta(seconds=90):
+            logger.info(f"Data is up to date for {market_slug}")
+            return {
+                'market_slug': market_slug,
+                'status': 'up_to_date',
+                'records_added': 0
+            }
+        
         # Determine start date
         if last_timestamp:
             # Start from last timestamp + 1 minute to avoid duplicates
@@ -1,6 +1,17 @@
 import requests
 import json
 import csv
+from operator import itemgetter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared session so every slug lookup reuses pooled connections to the Gamma API
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
 
 def get_market_info_from_slug(slug):
     """
@@ -9,7 +20,7 @@ def get_market_info_from_slug(slug):
     """
     # Method 1: Try direct slug endpoint (this should work for all!)
     gamma_slug_url = f"https://gamma-api.polymarket.com/markets/slug/{slug}"
-    response = requests.get(gamma_slug_url)
+    response = _SESSION.get(gamma_slug_url, timeout=10)
     
     if response.status_code == 200:
         market = response.json()
@@ -25,7 +36,7 @@ def get_market_info_from_slug(slug):
     
     # Method 2: Try the events endpoint as fallback
     gamma_events_url = f"https://gamma-api.polymarket.com/events?slug={slug}"
-    response = requests.get(gamma_events_url)
+    response = _SESSION.get(gamma_events_url, timeout=10)
     
     if response.status_code == 200:
         data = response.json()
@@ -78,9 +89,11 @@ for i, slug in enumerate(slugs, 1):
 
 # Write to CSV
 with open('polymarket_tokens.csv', 'w', newline='') as f:
-    writer = csv.DictWriter(f, fieldnames=['slug', 'tokenid1', 'tokenid2', 'conditionId'])
-    writer.writeheader()
-    writer.writerows(results)
+    fieldnames = ['slug', 'tokenid1', 'tokenid2', 'conditionId']
+    get_row = itemgetter(*fieldnames)
+    writer = csv.writer(f)
+    writer.writerow(fieldnames)
+    writer.writerows(get_row(r) for r in results)
 
 print(f"\n✓ Done! Results saved to polymarket_tokens.csv")
 print(f"Processed {len(results)} markets")
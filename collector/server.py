@@ -2,14 +2,31 @@
 """
 Web server for Render deployment
 Provides an HTTP endpoint that triggers data collection
+
+Built on the stdlib ThreadingHTTPServer on purpose: collector runs happen on a
+background worker, so request threads only serve health probes, cached static
+bodies and job bookkeeping - not enough traffic to justify an ASGI stack
+(uvicorn/starlette) as an extra deployment dependency.
+
+Runs as a single process on purpose too: job status, the reuse window for
+repeated triggers and the one-collection-at-a-time guard all live in process
+memory, so forked workers would each run collections and lose track of jobs
+accepted by the others.
 """
 
 import os
-import json
-from datetime import datetime, timezone
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
+import queue
+import select
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
 import logging
+from logging.handlers import QueueHandler, QueueListener
 
 # Import the collectors
 from poly_collector import PolymarketCollector
@@ -24,252 +41,473 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Error messages in responses are capped; the full text and traceback go to the log
+_MAX_ERROR_LEN = 512
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queue handler that leaves message and traceback formatting to the listener thread"""
+    
+    def prepare(self, record):
+        return record
+
+
+def _start_log_listener():
+    """Route root logging through a queue so request threads never block on log I/O"""
+    root = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [_DeferredQueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+
+@dataclass(slots=True, frozen=True)
+class Config:
+    """Server settings, resolved from the environment once at startup"""
+    port: int = 8000
+    log_access: bool = True  # LOG_ACCESS=0 drops per-request access log lines
+    
+    @classmethod
+    def from_env(cls) -> 'Config':
+        return cls(
+            port=int(os.environ.get('PORT', 8000)),
+            log_access=os.environ.get('LOG_ACCESS', '1') != '0'
+        )
+
+try:
+    import orjson
+    
+    def _dump(obj):
+        """Serialize a response to JSON bytes (datetimes encoded natively)"""
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC)
+except ImportError:
+    import json
+    
+    def _dump(obj):
+        """Serialize a response to JSON bytes (stdlib fallback)"""
+        return json.dumps(obj, default=lambda o: o.isoformat()).encode()
+
+# Collection endpoints sharing the same success/error response shape:
+# path -> (log label, platform, collector class, collection method name)
+ROUTES = {
+    '/collect': ('Polymarket collection', 'polymarket', PolymarketCollector, 'collect_all'),
+    '/collect-prices': ('Polymarket price collection', 'polymarket', PolymarketPriceCollector, 'collect_all_prices'),
+    '/collect-kalshi': ('Kalshi price collection', 'kalshi', KalshiCollector, 'collect_all_prices'),
+}
+
+# Static response bodies, serialized once at import time
+_ROOT_INFO = {
+    'service': 'Prediction Markets Data Collector',
+    'platforms': ['Polymarket', 'Kalshi'],
+    'endpoints': {
+        '/health': 'Health check',
+        '/collect': 'Queue Polymarket data collection (returns job_id)',
+        '/collect-prices': 'Queue Polymarket price collection (returns job_id)',
+        '/collect-kalshi': 'Queue Kalshi price collection (returns job_id)',
+        '/collect/<job_id>': 'Status and stats of a queued collection job',
+        '/collect-all': 'Trigger collection for all platforms',
+        '/detect-signals': 'Detect market signals (params: threshold=0.05)',
+        '/kalshi/add-market': 'POST: Add a Kalshi market to tracking'
+    }
+}
+_ROOT_PREFIX = _dump(_ROOT_INFO)[:-1] + b',"timestamp":"'
+_ROOT_SUFFIX = b'"}'
+_NOT_FOUND_BODY = _dump({'error': 'Not found'})
+
+# (monotonic time, ISO timestamp bytes) of the last _now_iso() refresh
+_ts_cache = (0.0, b'')
+
+
+def _now_iso():
+    """Current UTC time as ISO-8601 bytes, refreshed at most once per second"""
+    global _ts_cache
+    now = time.monotonic()
+    if now - _ts_cache[0] > 1.0:
+        _ts_cache = (now, datetime.now(timezone.utc).isoformat().encode())
+    return _ts_cache[1]
+
+# Raw header blocks per status code; Content-Length is filled in per response
+_RESPONSE_HEADERS = {
+    status: (
+        f"HTTP/1.1 {status} {reason}\r\n"
+        "Content-Type: application/json\r\n"
+        "Content-Length: %d\r\n\r\n"
+    ).encode()
+    for status, reason in ((200, 'OK'), (202, 'Accepted'), (404, 'Not Found'), (500, 'Internal Server Error'))
+}
+
+_CHUNKED_HEADERS = (
+    "HTTP/1.1 200 OK\r\n"
+    "Content-Type: application/json\r\n"
+    "Transfer-Encoding: chunked\r\n\r\n"
+).encode()
+_CHUNK_SIZE = 16384
+
+
+def _iter_json(obj, depth=3):
+    """
+    Serialize obj as JSON piecewise: dicts and lists down to the given depth
+    are emitted member by member, anything deeper in one _dump call
+    """
+    if depth and isinstance(obj, dict):
+        yield b'{'
+        for i, (key, value) in enumerate(obj.items()):
+            yield (b',' if i else b'') + _dump(key) + b':'
+            yield from _iter_json(value, depth - 1)
+        yield b'}'
+    elif depth and isinstance(obj, list):
+        yield b'['
+        for i, item in enumerate(obj):
+            if i:
+                yield b','
+            yield from _iter_json(item, depth - 1)
+        yield b']'
+    else:
+        yield _dump(obj)
+
+# Full /health response (headers + body), rebuilt only when _now_iso() ticks
+_HEALTH_PREFIX = b'{"status":"healthy","timestamp":"'
+_HEALTH_SUFFIX = b'"}'
+_health_cache = (b'', b'')
+
+
+def _health_response():
+    """Complete /health HTTP response bytes for the current coarse timestamp"""
+    global _health_cache
+    timestamp = _now_iso()
+    if _health_cache[0] is not timestamp:
+        body = _HEALTH_PREFIX + timestamp + _HEALTH_SUFFIX
+        _health_cache = (timestamp, _RESPONSE_HEADERS[200] % len(body) + body)
+    return _health_cache[1]
+
+# Collection and detection runs are serialized; health checks are not
+_collection_guard = threading.Semaphore(1)
+
+# Queued collection jobs: (job_id, ROUTES entry) in, job status dicts out.
+# Only the most recent _MAX_JOBS results are kept.
+_jobs = queue.Queue()
+_results = {}
+_results_lock = threading.Lock()
+_MAX_JOBS = 100
+
+# Repeat triggers for a collector that is queued, running, or finished
+# successfully within _COLLECT_TTL get the existing job instead of a new run
+_COLLECT_TTL = timedelta(seconds=30)
+_latest_jobs = {}
+_latest_jobs_lock = threading.Lock()
+
+
+# One long-lived instance per collector class, so Supabase clients and HTTP
+# sessions are reused across runs. Created lazily (a missing env var surfaces as
+# a failed job rather than a crashed server) and only used under _collection_guard.
+_collectors = {}
+
+
+def _get_collector(collector_cls):
+    """Return the shared instance of a collector class"""
+    collector = _collectors.get(collector_cls)
+    if collector is None:
+        collector = _collectors[collector_cls] = collector_cls()
+    return collector
+
+
+def _set_job(job_id, job):
+    """Record a job's status, dropping the oldest jobs beyond _MAX_JOBS"""
+    with _results_lock:
+        _results[job_id] = job
+        while len(_results) > _MAX_JOBS:
+            del _results[next(iter(_results))]
+
+
+def _collection_worker():
+    """Run queued collection jobs one at a time"""
+    while True:
+        job_id, (label, platform, collector_cls, method_name) = _jobs.get()
+        # Status dicts are replaced, never mutated, so readers can copy them safely
+        _set_job(job_id, {'status': 'running', 'platform': platform, 'timestamp': datetime.now(timezone.utc)})
+        try:
+            with _collection_guard:
+                collector = _get_collector(collector_cls)
+                stats = getattr(collector, method_name)()
+            job = {'status': 'success', 'platform': platform, 'stats': stats}
+        except Exception as e:
+            logger.error(f"{label} error: {e}", exc_info=True)
+            job = {'status': 'error', 'platform': platform, 'error': str(e)[:_MAX_ERROR_LEN]}
+        job['timestamp'] = datetime.now(timezone.utc)
+        _set_job(job_id, job)
+
+
 class CollectorHandler(BaseHTTPRequestHandler):
     """HTTP request handler for triggering collection"""
     
-    def do_GET(self):
-        """Handle GET requests"""
-        parsed_path = urlparse(self.path)
-        
-        # Health check endpoint
-        if parsed_path.path == '/health':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            response = {
-                'status': 'healthy',
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            }
-            self.wfile.write(json.dumps(response).encode())
+    # Buffer socket writes so stdlib paths that write several pieces (e.g.
+    # send_error on a malformed request) still go out in one send
+    rbufsize = 65536
+    wbufsize = 65536
+    
+    # Persistent connections, so health probes reuse one TCP (and TLS) session.
+    # Every response carries Content-Length; idle connections close after timeout.
+    protocol_version = 'HTTP/1.1'
+    timeout = 60
+    
+    # Replaced by run_server with the startup config
+    cfg = Config()
+    
+    def setup(self):
+        """Disable Nagle's algorithm so small JSON replies are not delayed"""
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    
+    def _send_body(self, status, body):
+        """Send an already-serialized JSON body with the given status code"""
+        # Status line, headers and body go out in a single write, flushed
+        # straight away rather than when the handler returns
+        self.wfile.write(_RESPONSE_HEADERS[status] % len(body) + body)
+        self.wfile.flush()
+        self.log_request(status, len(body))
+    
+    def _send_json(self, status, response):
+        """Send a JSON response with the given status code"""
+        self._send_body(status, _dump(response))
+    
+    def _send_json_stream(self, response):
+        """
+        Send a 200 JSON response with chunked transfer-encoding, so large
+        stats are never held in memory as one serialized body
+        """
+        # Long-running requests may outlive the caller's timeout; don't
+        # serialize stats nobody will read
+        if self._client_gone():
+            logger.warning(f"Client {self.client_address[0]} disconnected, dropping response")
+            self.close_connection = True
             return
         
-        # Polymarket collection endpoint
-        if parsed_path.path == '/collect':
+        # HTTP/1.0 clients can't read a chunked body
+        if self.request_version != 'HTTP/1.1':
             try:
-                logger.info("Polymarket collection triggered via HTTP")
-                collector = PolymarketCollector()
-                stats = collector.collect_all()
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                
-                response = {
-                    'status': 'success',
-                    'platform': 'polymarket',
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                    'stats': stats
-                }
-                self.wfile.write(json.dumps(response).encode())
-                
+                body = _dump(response)
             except Exception as e:
-                logger.error(f"Polymarket collection error: {e}", exc_info=True)
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                response = {
-                    'status': 'error',
-                    'platform': 'polymarket',
-                    'error': str(e),
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                }
-                self.wfile.write(json.dumps(response).encode())
+                self._send_error("Response serialization", e)
+                return
+            self._send_body(200, body)
             return
         
-        # Polymarket price collection endpoint
-        if parsed_path.path == '/collect-prices':
-            try:
-                logger.info("Polymarket price collection triggered via HTTP")
-                collector = PolymarketPriceCollector()
-                stats = collector.collect_all_prices()
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                
-                response = {
-                    'status': 'success',
-                    'platform': 'polymarket',
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                    'stats': stats
-                }
-                self.wfile.write(json.dumps(response).encode())
-                
-            except Exception as e:
-                logger.error(f"Polymarket price collection error: {e}", exc_info=True)
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                response = {
-                    'status': 'error',
-                    'platform': 'polymarket',
-                    'error': str(e),
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                }
-                self.wfile.write(json.dumps(response).encode())
+        # Headers ride along with the first chunk, the terminator with the last.
+        # Nothing is written until the first chunk has serialized, so an
+        # encoding error up to that point still gets a 500
+        out = bytearray(_CHUNKED_HEADERS)
+        buf = bytearray()
+        sent = False
+        try:
+            for fragment in _iter_json(response):
+                buf += fragment
+                if len(buf) >= _CHUNK_SIZE:
+                    out += b'%x\r\n%s\r\n' % (len(buf), buf)
+                    self.wfile.write(out)
+                    sent = True
+                    out.clear()
+                    buf.clear()
+        except OSError:
+            # Socket errors mean the client is gone; nothing left to tell it
+            raise
+        except Exception as e:
+            if not sent:
+                self._send_error("Response serialization", e)
+                return
+            # The 200 is already out; close without the terminating chunk so
+            # the client sees an incomplete body rather than a complete one
+            logger.error(f"Response serialization error after headers were sent: {e}", exc_info=True)
+            self.close_connection = True
             return
+        if buf:
+            out += b'%x\r\n%s\r\n' % (len(buf), buf)
+        out += b'0\r\n\r\n'
+        self.wfile.write(out)
+        self.wfile.flush()
+        self.log_request(200)
+    
+    def _client_gone(self):
+        """True if the peer has already closed its end of the connection"""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            return bool(readable) and self.connection.recv(1, socket.MSG_PEEK) == b''
+        except OSError:
+            return True
+    
+    def _send_error(self, label, e, platform=None):
+        """Log a failed request and send a 500 response"""
+        logger.error(f"{label} error: {e}", exc_info=True)
+        response = {'status': 'error'}
+        if platform:
+            response['platform'] = platform
+        response['error'] = str(e)[:_MAX_ERROR_LEN]
+        response['timestamp'] = datetime.now(timezone.utc)
+        self._send_json(500, response)
+    
+    def do_GET(self):
+        """Handle GET requests"""
+        # Split off the query string only when there is one; it is parsed
+        # lazily by the handlers that need it
+        path = self.path
+        q = path.find('?')
+        if q < 0:
+            self.query = ''
+        else:
+            path, self.query = path[:q], path[q + 1:]
         
-        # Kalshi price collection endpoint
-        if parsed_path.path == '/collect-kalshi':
-            try:
-                logger.info("Kalshi price collection triggered via HTTP")
-                collector = KalshiCollector()
-                stats = collector.collect_all_prices()
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                
-                response = {
-                    'status': 'success',
-                    'platform': 'kalshi',
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                    'stats': stats
-                }
-                self.wfile.write(json.dumps(response).encode())
-                
-            except Exception as e:
-                logger.error(f"Kalshi price collection error: {e}", exc_info=True)
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                response = {
-                    'status': 'error',
-                    'platform': 'kalshi',
-                    'error': str(e),
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                }
-                self.wfile.write(json.dumps(response).encode())
-            return
+        handler = _GET_ROUTES.get(path)
+        if handler is None:
+            if path.startswith('/collect/'):
+                handler = CollectorHandler._job_status
+                self.job_id = path[len('/collect/'):]
+            else:
+                handler = CollectorHandler._not_found
+        handler(self)
+    
+    def _health(self):
+        """Health check endpoint"""
+        self.wfile.write(_health_response())
+        self.wfile.flush()
+        self.log_request(200)
+    
+    def _root(self):
+        """Root endpoint (only the timestamp varies between requests)"""
+        self._send_body(200, _ROOT_PREFIX + _now_iso() + _ROOT_SUFFIX)
+    
+    def _not_found(self):
+        """404 for unknown paths"""
+        self._send_body(404, _NOT_FOUND_BODY)
+    
+    def _collect(self, label, platform, collector_cls, method_name):
+        """Queue a single collector run and return its job id immediately"""
+        now = datetime.now(timezone.utc)
+        key = (collector_cls, method_name)
         
-        # Combined collection endpoint (both platforms)
-        if parsed_path.path == '/collect-all':
-            try:
-                logger.info("Combined collection triggered via HTTP")
-                results = {}
-                
+        with _latest_jobs_lock:
+            job_id = _latest_jobs.get(key)
+            job = _results.get(job_id)
+            cached = job is not None and (
+                job['status'] in ('queued', 'running')
+                or (job['status'] == 'success' and now - job['timestamp'] < _COLLECT_TTL)
+            )
+            if cached:
+                logger.info(f"{label} triggered via HTTP, reusing job {job_id}")
+            else:
+                job_id = uuid.uuid4().hex
+                logger.info(f"{label} triggered via HTTP (job {job_id})")
+                _set_job(job_id, {'status': 'queued', 'platform': platform, 'timestamp': now})
+                _latest_jobs[key] = job_id
+                _jobs.put((job_id, (label, platform, collector_cls, method_name)))
+        
+        self._send_json(202, {
+            'status': 'accepted',
+            'platform': platform,
+            'job_id': job_id,
+            'cached': cached,
+            'timestamp': now
+        })
+    
+    def _job_status(self):
+        """Report the status (and stats, once finished) of a queued job"""
+        job = _results.get(self.job_id)
+        if job is None:
+            self._not_found()
+            return
+        self._send_json_stream({'job_id': self.job_id, **job})
+    
+    def _collect_all(self):
+        """Run price collection for every platform"""
+        try:
+            logger.info("Combined collection triggered via HTTP")
+            results = {}
+            
+            with _collection_guard:
                 # Collect Polymarket prices
                 try:
-                    poly_collector = PolymarketPriceCollector()
+                    poly_collector = _get_collector(PolymarketPriceCollector)
                     results['polymarket'] = poly_collector.collect_all_prices()
                 except Exception as e:
                     logger.error(f"Polymarket collection failed: {e}")
-                    results['polymarket'] = {'error': str(e)}
+                    results['polymarket'] = {'error': str(e)[:_MAX_ERROR_LEN]}
                 
                 # Collect Kalshi prices
                 try:
-                    kalshi_collector = KalshiCollector()
+                    kalshi_collector = _get_collector(KalshiCollector)
                     results['kalshi'] = kalshi_collector.collect_all_prices()
                 except Exception as e:
                     logger.error(f"Kalshi collection failed: {e}")
-                    results['kalshi'] = {'error': str(e)}
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                
-                response = {
-                    'status': 'success',
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                    'results': results
-                }
-                self.wfile.write(json.dumps(response).encode())
-                
-            except Exception as e:
-                logger.error(f"Combined collection error: {e}", exc_info=True)
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                response = {
-                    'status': 'error',
-                    'error': str(e),
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                }
-                self.wfile.write(json.dumps(response).encode())
+                    results['kalshi'] = {'error': str(e)[:_MAX_ERROR_LEN]}
+        except Exception as e:
+            self._send_error("Combined collection", e)
             return
         
-        # Signal detection endpoint
-        if parsed_path.path == '/detect-signals':
-            try:
-                # Parse query parameters
-                query_params = parse_qs(parsed_path.query)
-                
-                # Get threshold parameter (default 5%)
-                threshold = float(query_params.get('threshold', [0.05])[0])
-                
-                logger.info(f"Signal detection triggered via HTTP (threshold: {threshold:.1%})")
-                
-                # Run detection
+        self._send_json_stream({
+            'status': 'success',
+            'timestamp': datetime.now(timezone.utc),
+            'results': results
+        })
+    
+    def _detect_signals(self):
+        """Run signal detection across all markets"""
+        try:
+            query_params = parse_qs(self.query)
+            
+            # Get threshold parameter (default 5%)
+            threshold = float(query_params.get('threshold', [0.05])[0])
+            
+            logger.info(f"Signal detection triggered via HTTP (threshold: {threshold:.1%})")
+            
+            # Run detection
+            with _collection_guard:
                 detector = SignalDetector(threshold_percent=threshold)
                 results = detector.process_all_markets()
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                
-                response = {
-                    'status': 'success',
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                    'threshold': threshold,
-                    'results': results
-                }
-                self.wfile.write(json.dumps(response).encode())
-                
-            except Exception as e:
-                logger.error(f"Signal detection error: {e}", exc_info=True)
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                response = {
-                    'status': 'error',
-                    'error': str(e),
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                }
-                self.wfile.write(json.dumps(response).encode())
+        except Exception as e:
+            self._send_error("Signal detection", e)
             return
         
-        # Root endpoint
-        if parsed_path.path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            response = {
-                'service': 'Prediction Markets Data Collector',
-                'platforms': ['Polymarket', 'Kalshi'],
-                'endpoints': {
-                    '/health': 'Health check',
-                    '/collect': 'Trigger Polymarket data collection',
-                    '/collect-prices': 'Trigger Polymarket price collection',
-                    '/collect-kalshi': 'Trigger Kalshi price collection',
-                    '/collect-all': 'Trigger collection for all platforms',
-                    '/detect-signals': 'Detect market signals (params: threshold=0.05)',
-                    '/kalshi/add-market': 'POST: Add a Kalshi market to tracking'
-                },
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            }
-            self.wfile.write(json.dumps(response).encode())
-            return
-        
-        # 404 for other paths
-        self.send_response(404)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        response = {'error': 'Not found'}
-        self.wfile.write(json.dumps(response).encode())
+        self._send_json_stream({
+            'status': 'success',
+            'timestamp': datetime.now(timezone.utc),
+            'threshold': threshold,
+            'results': results
+        })
+    
+    def log_request(self, code='-', size='-'):
+        """Per-request access log line, skipped entirely when LOG_ACCESS=0"""
+        if self.cfg.log_access:
+            super().log_request(code, size)
     
     def log_message(self, format, *args):
         """Override to use logger"""
-        logger.info("%s - %s" % (self.client_address[0], format % args))
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("%s - %s", self.client_address[0], format % args)
+
 
+# path -> handler method; single-collector endpoints come from ROUTES
+_GET_ROUTES = {
+    '/health': CollectorHandler._health,
+    '/': CollectorHandler._root,
+    '/collect-all': CollectorHandler._collect_all,
+    '/detect-signals': CollectorHandler._detect_signals,
+}
+for _path, _route in ROUTES.items():
+    _GET_ROUTES[_path] = lambda handler, route=_route: handler._collect(*route)
 
-def run_server(port=8000):
+
+def run_server(config):
     """Run the HTTP server"""
-    server_address = ('', port)
-    httpd = HTTPServer(server_address, CollectorHandler)
-    logger.info(f'Starting server on port {port}')
+    CollectorHandler.cfg = config
+    _start_log_listener()
+    
+    server_address = ('', config.port)
+    # Threaded so /health stays responsive while a collection is running
+    # (ThreadingHTTPServer uses daemon threads, so shutdown never waits on one)
+    httpd = ThreadingHTTPServer(server_address, CollectorHandler)
+    threading.Thread(target=_collection_worker, daemon=True).start()
+    logger.info(f'Starting server on port {config.port} (pid {os.getpid()})')
     httpd.serve_forever()
 
 
 if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 8000))
-    run_server(port)
\ No newline at end of file
+    run_server(Config.from_env())
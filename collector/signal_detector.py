@@ -7,13 +7,37 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
+import sys
 import logging
+import threading
+import time
 import csv
-from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+from datetime import datetime, timezone, timedelta, tzinfo
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterable, Iterator
 from dataclasses import dataclass
 
-from supabase import create_client, Client
+import httpx
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from postgrest.exceptions import APIError
+from supabase import create_client, Client, ClientOptions
+
+from _signal_kernels import NUMBA_AVAILABLE, _detect_all, _detect_trends_loop
+
+# Timestamp parser: ciso8601 is much faster when installed; Python 3.11+
+# fromisoformat accepts a trailing 'Z' directly; older versions need it rewritten
+try:
+    from ciso8601 import parse_datetime as _parse_ts
+except ImportError:
+    if sys.version_info >= (3, 11):
+        _parse_ts = datetime.fromisoformat
+    else:
+        def _parse_ts(value: str) -> datetime:
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,14 +48,145 @@ logger = logging.getLogger(__name__)
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
 SUPABASE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
 
+# Markets processed concurrently; fetches are network-bound so this overlaps latency
+MAX_WORKERS = 16
+
+# Rows per page when paginating Supabase queries
+PAGE_SIZE = 1000
+
+# Detection results for unchanged price histories, keyed by market, detector
+# settings and a fingerprint of the series (length and last point). Shared
+# across instances since the HTTP endpoint builds a detector per request;
+# the oldest entries beyond DETECTION_CACHE_SIZE are dropped
+_detection_cache = {}
+_detection_cache_lock = threading.Lock()
+DETECTION_CACHE_SIZE = 4096
+
+# Price series of active markets from earlier bulk fetches, keyed by
+# (source, market id) with the time of their last full fetch. Later runs of
+# a long-lived process only fetch rows from each market's last cached
+# timestamp on; after PRICE_CACHE_TTL seconds a market is fully refetched so
+# backfilled history is picked up
+_price_cache = {}
+_price_cache_lock = threading.Lock()
+PRICE_CACHE_TTL = 3600
+# Cached markets whose last timestamps lie within this many seconds of each
+# other are refreshed by one query from the earliest of them
+PRICE_REFRESH_SLACK = 3600
+
+# Active market lists change rarely, so reuse them for this many seconds
+# (failed lookups are not cached)
+ACTIVE_MARKETS_TTL = 300
+_active_markets_cache = {}
+_active_markets_lock = threading.Lock()
+
+# Signals per upsert request, and concurrent upsert requests
+UPSERT_BATCH_SIZE = 500
+UPSERT_WORKERS = 4
+
+# Price RPCs found not to be deployed; their callers go straight to the
+# paginated queries instead of probing the function on every fetch
+_unavailable_rpcs = set()
+
+# PostgREST error codes for a function that doesn't exist (PGRST202 on
+# current versions, the Postgres undefined_function code on older ones)
+MISSING_FUNCTION_CODES = {'PGRST202', '42883'}
+
+# Keep-alive connections in the shared PostgREST session; market workers and
+# each bulk fetch's batch workers can all be in flight at once
+HTTP_POOL_CONNECTIONS = 2 * MAX_WORKERS
+
+
+@lru_cache(maxsize=1)
+def get_supabase_client() -> Client:
+    """
+    Return the shared Supabase client. Built once per process so every
+    detector reuses the same pooled (HTTP/2, keep-alive) PostgREST session
+    instead of paying a fresh TCP/TLS handshake per instance.
+    """
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY")
+    client = create_client(
+        SUPABASE_URL,
+        SUPABASE_KEY,
+        options=ClientOptions(postgrest_client_timeout=30)
+    )
+    
+    # The default httpx pool keeps only 20 idle connections, fewer than the
+    # requests the worker pools run concurrently, so the excess would
+    # reconnect on every page. Swap in a session sized for them
+    postgrest = client.postgrest
+    session = postgrest.session
+    postgrest.session = httpx.Client(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        follow_redirects=True,
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=HTTP_POOL_CONNECTIONS,
+            max_keepalive_connections=HTTP_POOL_CONNECTIONS,
+            keepalive_expiry=300
+        )
+    )
+    session.close()
+    return client
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_US = timedelta(microseconds=1)
+_US_PER_MINUTE = 60_000_000
 
-@dataclass
+
+def _from_epoch_us(us: int, tz: Optional[tzinfo]) -> datetime:
+    """Datetime for epoch microseconds in the given timezone (naive if None)"""
+    moment = _EPOCH + timedelta(microseconds=us)
+    if tz is None:
+        return moment.replace(tzinfo=None)
+    return moment.astimezone(tz)
+
+
+@dataclass(slots=True)
+class PriceSeries:
+    """
+    Price history as parallel arrays rather than a list of (timestamp, price)
+    tuples: 8 bytes per timestamp and per price instead of a tuple, datetime
+    and float object per point
+    """
+    ts: np.ndarray  # datetime64[us] in timestamp order; UTC unless tz is None
+    px: np.ndarray  # float64 prices
+    tz: Optional[tzinfo] = timezone.utc  # None for naive timestamps
+    
+    def __len__(self) -> int:
+        return len(self.px)
+
+
+def _series_from_arrays(ts_us: Iterable[int], px: Iterable[float], cents: bool = False) -> PriceSeries:
+    """
+    Build a PriceSeries from epoch microseconds and prices (as returned by the
+    price RPCs); with cents, prices above 1 are scaled to 0-1
+    """
+    px = np.asarray(px, dtype=np.float64)
+    if cents:
+        px = np.where(px > 1, px / 100.0, px)
+    return PriceSeries(np.asarray(ts_us, dtype=np.int64).view('datetime64[us]'), px)
+
+
+def _epoch_us(value: str) -> int:
+    """Parse a timestamp string with a UTC offset to epoch microseconds"""
+    return (_parse_ts(value) - _EPOCH) // _ONE_US
+
+
+@dataclass(slots=True)
 class Signal:
-    """Signal data structure for both alerts and trends"""
+    """
+    Signal data structure for both alerts and trends. Times are kept as epoch
+    microseconds; datetimes are only built when a signal is formatted
+    """
     market_id: str
     source: str
-    timestamp: datetime
-    prior_timestamp: datetime
+    time_us: int
+    prior_time_us: int
     prior_price: float
     new_price: float
     percent_change: float
@@ -40,6 +195,29 @@ class Signal:
     ticker: Optional[str] = None
     condition_id: Optional[str] = None
     window_size: Optional[int] = None  # For trends
+    tz: Optional[tzinfo] = timezone.utc  # Timezone of the source prices
+    
+    @property
+    def timestamp(self) -> datetime:
+        return _from_epoch_us(self.time_us, self.tz)
+    
+    @property
+    def prior_timestamp(self) -> datetime:
+        return _from_epoch_us(self.prior_time_us, self.tz)
+    
+    @property
+    def time_window_minutes(self) -> int:
+        return (self.time_us - self.prior_time_us) // _US_PER_MINUTE
+
+
+def _iso_timestamps(signals: List[Signal]) -> Dict[Tuple[int, Optional[tzinfo]], str]:
+    """
+    Format every distinct signal time once, keyed by (microseconds, timezone).
+    Neighbouring alerts share timestamps (one's current is the next's prior)
+    """
+    stamps = {(signal.time_us, signal.tz) for signal in signals}
+    stamps.update((signal.prior_time_us, signal.tz) for signal in signals)
+    return {stamp: _from_epoch_us(*stamp).isoformat() for stamp in stamps}
 
 
 class SignalDetector:
@@ -65,20 +243,15 @@ class SignalDetector:
         self.trend_threshold = trend_threshold_percent
         self.trend_window_size = trend_window_size
         self.trend_stability_points = trend_stability_points
-        self.supabase = self._get_supabase_client()
+        self.supabase = get_supabase_client()
     
-    def _get_supabase_client(self) -> Client:
-        """Initialize Supabase client"""
-        if not SUPABASE_URL or not SUPABASE_KEY:
-            raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY")
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
-    
-    def detect_signals(self, prices: List[Tuple[datetime, float]]) -> List[Signal]:
+    def detect_signals(self, prices: PriceSeries) -> List[Signal]:
         """
-        Detect alert signals from a list of (timestamp, price) tuples
+        Detect alert signals from a market's price series
         
         Args:
-            prices: List of (timestamp, price) sorted by timestamp
+            prices: PriceSeries in timestamp order (datetime64[us] timestamps
+                and float64 prices as parallel arrays)
             
         Returns:
             List of detected signals
@@ -88,220 +261,641 @@ class SignalDetector:
         if len(prices) < 2:
             return signals
         
-        for i in range(1, len(prices)):
-            prior_time, prior_price = prices[i-1]
-            current_time, current_price = prices[i]
-            
-            # Skip if prior price is zero (avoid division by zero)
-            if prior_price == 0:
-                continue
-            
-            # Calculate relative change
-            price_change = current_price - prior_price
-            percent_change = price_change / prior_price
-            
-            # Check if change exceeds threshold
-            if abs(percent_change) >= self.threshold:
-                direction = 'up' if price_change > 0 else 'down'
-                
-                signal = Signal(
-                    market_id='',  # Will be set by caller
-                    source='',     # Will be set by caller
-                    timestamp=current_time,
-                    prior_timestamp=prior_time,
-                    prior_price=prior_price,
-                    new_price=current_price,
-                    percent_change=percent_change,
-                    direction=direction,
-                    signal_type='relative_change'
-                )
-                signals.append(signal)
+        # Relative change between neighbours for the whole series at once;
+        # zero prior prices are masked out (avoid division by zero)
+        px = prices.px
         
-        return signals
+        # Flat series: no neighbour can move further than the full price range,
+        # so if that is under the threshold relative to the lowest price, stop
+        lo = px.min()
+        if lo > 0 and np.ptp(px) / lo < self.threshold:
+            return signals
+        
+        prior = px[:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            changes = (px[1:] - prior) / prior
+        hits = np.flatnonzero((prior != 0) & (np.abs(changes) >= self.threshold))
+        
+        # Only build Signal objects for changes that exceed the threshold
+        return self._alert_signals(prices, hits + 1, changes[hits])
     
-    def detect_trends(self, prices: List[Tuple[datetime, float]]) -> List[Signal]:
+    def detect_trends(self, prices: PriceSeries) -> List[Signal]:
         """
         Detect sustained trend signals using rolling window
         
         Args:
-            prices: List of (timestamp, price) sorted by timestamp
+            prices: Price series sorted by timestamp
             
         Returns:
             List of detected trend signals
         """
         trends = []
         
+        window_size = self.trend_window_size
+        stability_points = self.trend_stability_points
+        
         # Need enough points for window + stability check
-        min_points = self.trend_window_size + self.trend_stability_points
-        if len(prices) < min_points:
+        if len(prices) < window_size + stability_points:
             return trends
         
-        # Track last detected trend to avoid duplicates for same trend
-        last_trend_idx = -1
+        px = prices.px
         
-        for i in range(self.trend_window_size, len(prices) - self.trend_stability_points + 1):
-            # Get window of previous prices
-            window_start = i - self.trend_window_size
-            window = prices[window_start:i]
-            window_prices = [p for _, p in window]
-            
-            # Calculate window baseline (mean)
-            window_mean = sum(window_prices) / len(window_prices)
-            
-            if window_mean == 0:
-                continue
-            
-            # Current price and timestamp
-            current_time, current_price = prices[i]
-            window_start_time, window_start_price = window[0]
-            
-            # Calculate change from window mean
-            price_change = current_price - window_mean
-            percent_change = price_change / window_mean
-            
-            # Check if exceeds trend threshold
-            if abs(percent_change) < self.trend_threshold:
-                continue
+        # Flat series: no price is further from a window mean than the full
+        # range, so skip the scan when that range is under the threshold
+        # relative to the lowest price (small margin for rounding in the mean)
+        lo = px.min()
+        if lo > 0 and np.ptp(px) < self.trend_threshold * lo * (1 - 1e-9):
+            return trends
+        
+        if NUMBA_AVAILABLE:
+            # Compiled single pass: window sums, stability and dedupe fused
+            trend_idx, trend_means, trend_changes = _detect_trends_loop(
+                np.ascontiguousarray(px, dtype=np.float64),
+                window_size, stability_points, self.trend_threshold
+            )
+        else:
+            trend_idx, trend_means, trend_changes = self._scan_trends(px)
+        
+        return self._trend_signals(prices, trend_idx, trend_means, trend_changes)
+    
+    def detect_all(self, prices: PriceSeries, detect_trends: bool = True) -> Dict[str, List[Signal]]:
+        """
+        Detect alerts and, optionally, trends. With Numba both come from one
+        compiled pass over the prices; otherwise the detectors run in turn
+        
+        Args:
+            prices: Price series sorted by timestamp
+            detect_trends: Whether to detect trends in addition to alerts
             
+        Returns:
+            Dict with 'alerts' and 'trends' lists
+        """
+        if not (NUMBA_AVAILABLE and detect_trends):
+            return {
+                'alerts': self.detect_signals(prices),
+                'trends': self.detect_trends(prices) if detect_trends else []
+            }
+        
+        alert_idx, alert_changes, trend_idx, trend_means, trend_changes = _detect_all(
+            np.ascontiguousarray(prices.px, dtype=np.float64),
+            self.threshold, self.trend_window_size, self.trend_stability_points, self.trend_threshold
+        )
+        return {
+            'alerts': self._alert_signals(prices, alert_idx, alert_changes),
+            'trends': self._trend_signals(prices, trend_idx, trend_means, trend_changes)
+        }
+    
+    def _alert_signals(
+        self,
+        prices: PriceSeries,
+        idx: np.ndarray,
+        changes: np.ndarray
+    ) -> List[Signal]:
+        """Build alert Signals for points idx, each compared with the point before"""
+        signals = []
+        ts = prices.ts.view(np.int64)
+        px = prices.px
+        
+        for prior_time, current_time, prior_price, current_price, percent_change in zip(
+            ts[idx - 1].tolist(), ts[idx].tolist(),
+            px[idx - 1].tolist(), px[idx].tolist(), changes.tolist()
+        ):
+            price_change = current_price - prior_price
             direction = 'up' if price_change > 0 else 'down'
             
-            # Check stability: verify trend holds for next few points
-            is_stable = True
-            for j in range(1, min(self.trend_stability_points + 1, len(prices) - i)):
-                future_time, future_price = prices[i + j]
-                future_change = (future_price - window_mean) / window_mean
-                
-                # If direction reverses significantly, trend is not stable
-                if direction == 'up' and future_change < percent_change * 0.5:
-                    is_stable = False
-                    break
-                elif direction == 'down' and future_change > percent_change * 0.5:
-                    is_stable = False
-                    break
-            
-            if not is_stable:
-                continue
-            
-            # Avoid detecting same trend multiple times (skip nearby indices)
-            if i - last_trend_idx < self.trend_window_size // 2:
-                continue
-            
-            last_trend_idx = i
-            
+            signal = Signal(
+                market_id='',  # Will be set by caller
+                source='',     # Will be set by caller
+                time_us=current_time,
+                prior_time_us=prior_time,
+                prior_price=prior_price,
+                new_price=current_price,
+                percent_change=percent_change,
+                direction=direction,
+                signal_type='relative_change',
+                tz=prices.tz
+            )
+            signals.append(signal)
+        
+        return signals
+    
+    def _trend_signals(
+        self,
+        prices: PriceSeries,
+        idx: np.ndarray,
+        means: np.ndarray,
+        changes: np.ndarray
+    ) -> List[Signal]:
+        """Build trend Signals for points idx against their window means"""
+        trends = []
+        window_size = self.trend_window_size
+        ts = prices.ts.view(np.int64)
+        
+        for current_time, window_start_time, current_price, window_mean, percent_change in zip(
+            ts[idx].tolist(), ts[idx - window_size].tolist(),
+            prices.px[idx].tolist(), means.tolist(), changes.tolist()
+        ):
             trend = Signal(
                 market_id='',  # Will be set by caller
                 source='',     # Will be set by caller
-                timestamp=current_time,
-                prior_timestamp=window_start_time,
+                time_us=current_time,
+                prior_time_us=window_start_time,
                 prior_price=window_mean,  # Use window mean as baseline
                 new_price=current_price,
                 percent_change=percent_change,
-                direction=direction,
+                direction='up' if current_price - window_mean > 0 else 'down',
                 signal_type='trend',
-                window_size=self.trend_window_size
+                window_size=window_size,
+                tz=prices.tz
             )
             trends.append(trend)
         
         return trends
     
-    def get_polymarket_prices(self, condition_id: str) -> List[Tuple[datetime, float]]:
-        """Get all price data for a Polymarket condition"""
+    def _scan_trends(self, px: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find trend points with NumPy (used when Numba is not installed)
+        
+        Args:
+            px: Prices in timestamp order as a float64 array
+            
+        Returns:
+            Arrays of trend indices, their window means and percent changes
+        """
+        window_size = self.trend_window_size
+        stability_points = self.trend_stability_points
+        threshold = self.trend_threshold
+        n = len(px)
+        
+        # Trend points i run from window_size to n - stability_points; row c
+        # of each array below is point i = c + window_size
+        last = min(n - stability_points, n - 1)
+        m = last - window_size + 1
+        
+        # Window means for all points at once: window_size vector adds of
+        # shifted slices instead of a Python sum() per point. Unlike a cumsum
+        # difference this keeps the left-to-right summation order, so means
+        # are bit-identical; tick-grid prices often tie the stability check
+        # exactly, and last-bit drift would flip those decisions
+        window_sums = px[:m].copy()
+        for k in range(1, window_size):
+            window_sums += px[k:k + m]
+        means = window_sums / window_size
+        
+        # Change from window mean; zero means are masked out
+        price_changes = px[window_size:last + 1] - means
+        with np.errstate(divide='ignore', invalid='ignore'):
+            changes = price_changes / means
+        candidates = np.flatnonzero((means != 0) & (np.abs(changes) >= threshold))
+        
+        # Check stability for all candidates at once: the next few points must
+        # not reverse by more than half the change (NaN padding past the end
+        # never fails a comparison, so the last points check what they have)
+        if stability_points > 0 and len(candidates):
+            padded = np.concatenate((px, np.full(stability_points, np.nan)))
+            future = sliding_window_view(padded[window_size + 1:], stability_points)[candidates]
+            baseline = means[candidates, None]
+            future_changes = (future - baseline) / baseline
+            half_change = changes[candidates, None] * 0.5
+            stable = np.where(
+                price_changes[candidates] > 0,
+                ~(future_changes < half_change).any(axis=1),
+                ~(future_changes > half_change).any(axis=1)
+            )
+            candidates = candidates[stable]
+        
+        # Avoid detecting same trend multiple times: keep a stable point only
+        # if it is far enough past the last kept trend. The first candidate is
+        # always kept, so when every gap already clears min_gap all are kept;
+        # otherwise the greedy choice needs one pass over the candidates
+        min_gap = window_size // 2
+        if not (np.diff(candidates) >= min_gap).all():
+            last_trend_idx = -1
+            keep = []
+            
+            for c in candidates.tolist():
+                i = c + window_size
+                if i - last_trend_idx < min_gap:
+                    continue
+                last_trend_idx = i
+                keep.append(c)
+            
+            candidates = np.array(keep, dtype=np.intp)
+        
+        return candidates + window_size, means[candidates], changes[candidates]
+    
+    def _parse_polymarket_rows(self, rows: Iterable[Dict[str, Any]]) -> PriceSeries:
+        """Convert polymarket_price_history rows to a price series"""
+        rows = list(rows)
+        
+        # Fill both arrays straight from the rows, with no per-row tuples
+        ts = np.fromiter((_epoch_us(row['timestamp']) for row in rows), dtype=np.int64, count=len(rows))
+        px = np.fromiter((row['price'] for row in rows), dtype=np.float64, count=len(rows))
+        return _series_from_arrays(ts, px)
+    
+    def _parse_kalshi_rows(self, rows: Iterable[Dict[str, Any]]) -> PriceSeries:
+        """Convert kalshi_price_history rows to a price series on a 0-1 scale"""
+        # Use price_close, fall back to price_mean (a 0 close is a real price);
+        # rows with neither are skipped
+        times = []
+        prices = []
+        for row in rows:
+            price = row.get('price_close')
+            if price is None:
+                price = row.get('price_mean')
+                if price is None:
+                    continue
+            times.append(row['timestamp'])
+            prices.append(price)
+        
+        ts = np.fromiter((_epoch_us(value) for value in times), dtype=np.int64, count=len(times))
+        px = np.fromiter(prices, dtype=np.float64, count=len(prices))
+        
+        # Convert from cents to 0-1 scale where needed
+        return _series_from_arrays(ts, px, cents=True)
+    
+    def _stream_all(
+        self,
+        build_query: Callable[[Optional[Dict[str, Any]]], Any]
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield every row of a query, fetching one page at a time so rows are
+        consumed as they arrive and only one page is held in memory. Pages use
+        keyset pagination: each seeks past the last row of the previous page
+        (an index range scan) instead of an OFFSET that Postgres has to scan
+        and discard, which made page k cost O(k) rows
+        
+        Args:
+            build_query: Given the last row seen (None for the first page),
+                returns the filtered and ordered query for the rows after it
+        """
+        last_row = None
+        
+        while True:
+            page = build_query(last_row).limit(PAGE_SIZE).execute().data
+            
+            if not page:
+                break
+            
+            yield from page
+            
+            # If we got fewer rows than a page, we've reached the end
+            if len(page) < PAGE_SIZE:
+                break
+            
+            last_row = page[-1]
+    
+    def _fetch_series_bulk(
+        self,
+        table: str,
+        columns: str,
+        id_col: str,
+        ids: List[str],
+        parse: Callable[[Iterable[Dict[str, Any]]], PriceSeries],
+        not_null: Optional[str] = None,
+        since: Optional[str] = None,
+        tiebreak: Optional[str] = None
+    ) -> Dict[str, PriceSeries]:
+        """
+        Fetch price series for many markets with one paginated IN query per
+        batch of ids, optionally only from timestamp `since` on. Rows arrive
+        ordered by market id, so each market's run of rows is parsed into
+        arrays as soon as it ends and the row dicts are dropped; markets
+        without rows get an empty series. `tiebreak` names a column (also in
+        `columns`) that orders rows sharing a market id and timestamp
+        """
+        series = {market_id: parse([]) for market_id in ids}
+        id_batch = 100  # Keep the IN list (and request URL) reasonably short
+        
+        def fetch_batch(batch):
+            def query(after):
+                query = self.supabase.table(table)\
+                    .select(f'{id_col}, {columns}')\
+                    .in_(id_col, batch)
+                if not_null:
+                    query = query.not_.is_(not_null, 'null')
+                if since:
+                    query = query.gte('timestamp', since)
+                if after:
+                    # Seek past the (market id, timestamp[, tiebreak]) of the
+                    # last row seen; values are quoted since tickers can
+                    # contain dots
+                    last_id, last_ts = after[id_col], after['timestamp']
+                    seek = [
+                        f'{id_col}.gt."{last_id}"',
+                        f'and({id_col}.eq."{last_id}",timestamp.gt."{last_ts}")'
+                    ]
+                    if tiebreak:
+                        seek.append(
+                            f'and({id_col}.eq."{last_id}",timestamp.eq."{last_ts}",'
+                            f'{tiebreak}.gt."{after[tiebreak]}")'
+                        )
+                    query = query.or_(','.join(seek))
+                query = query\
+                    .order(id_col, desc=False)\
+                    .order('timestamp', desc=False)
+                if tiebreak:
+                    query = query.order(tiebreak, desc=False)
+                return query
+            
+            # Batches hold disjoint ids, so workers write separate keys
+            for market_id, rows in groupby(self._stream_all(query), key=itemgetter(id_col)):
+                series[market_id] = parse(rows)
+        
+        # Batches are independent, so page through them concurrently
+        batches = [ids[b:b + id_batch] for b in range(0, len(ids), id_batch)]
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            list(executor.map(fetch_batch, batches))
+        
+        return series
+    
+    def _fetch_price_arrays(
+        self,
+        function: str,
+        ids: List[str],
+        since: Optional[str] = None
+    ) -> Optional[Dict[str, Tuple[list, list]]]:
+        """
+        Fetch price histories (from timestamp `since` on, if given) through a
+        columnar RPC, one call per batch of ids, returning market id ->
+        (epoch microseconds, prices). Each market comes back as two arrays
+        instead of a JSON object per row, with no pagination. Returns None if
+        the function isn't deployed (remembered for later calls); any other
+        error is raised.
+        
+        The functions (timestamps as microseconds so they round-trip exactly;
+        a condition's tokens share timestamps, so token_id orders ties the
+        same way as the paginated fallback):
+        
+            CREATE FUNCTION get_poly_prices(ids text[], since timestamptz DEFAULT NULL)
+            RETURNS TABLE(id text, ts bigint[], px double precision[])
+            LANGUAGE sql STABLE AS $$
+                SELECT condition_id,
+                       array_agg((extract(epoch FROM timestamp) * 1000000)::bigint ORDER BY timestamp, token_id),
+                       array_agg(price ORDER BY timestamp, token_id)
+                FROM polymarket_price_history
+                WHERE condition_id = ANY(ids) AND price IS NOT NULL
+                  AND (since IS NULL OR timestamp >= since)
+                GROUP BY condition_id
+            $$;
+            
+            CREATE FUNCTION get_kalshi_prices(ids text[], since timestamptz DEFAULT NULL)
+            RETURNS TABLE(id text, ts bigint[], px double precision[])
+            LANGUAGE sql STABLE AS $$
+                SELECT ticker,
+                       array_agg((extract(epoch FROM timestamp) * 1000000)::bigint ORDER BY timestamp),
+                       array_agg(coalesce(price_close, price_mean) ORDER BY timestamp)
+                FROM kalshi_price_history
+                WHERE ticker = ANY(ids) AND coalesce(price_close, price_mean) IS NOT NULL
+                  AND (since IS NULL OR timestamp >= since)
+                GROUP BY ticker
+            $$;
+        """
+        if function in _unavailable_rpcs:
+            return None
+        
+        id_batch = 100  # Keep each response reasonably sized
+        batches = [ids[b:b + id_batch] for b in range(0, len(ids), id_batch)]
+        
+        def fetch_batch(batch):
+            params = {'ids': batch}
+            if since:
+                params['since'] = since
+            return self.supabase.rpc(function, params).execute().data or []
+        
         try:
-            # Fetch all data using pagination
-            all_data = []
-            offset = 0
-            limit = 1000
-            
-            while True:
-                response = self.supabase.table('polymarket_price_history')\
-                    .select('timestamp, price')\
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                pages = list(executor.map(fetch_batch, batches))
+        except APIError as e:
+            if e.code not in MISSING_FUNCTION_CODES:
+                raise
+            # Function not deployed yet - caller falls back to paginated queries
+            _unavailable_rpcs.add(function)
+            logger.warning(f"{function} RPC not deployed, falling back to paginated queries: {e.message}")
+            return None
+        
+        return {row['id']: (row['ts'], row['px']) for page in pages for row in page}
+    
+    def _cached_prices_bulk(
+        self,
+        source: str,
+        ids: List[str],
+        fetch: Callable[[List[str], Optional[str]], Dict[str, PriceSeries]]
+    ) -> Dict[str, PriceSeries]:
+        """
+        Get price series for many markets, reusing series cached by earlier
+        runs and fetching only their newer rows
+        
+        Args:
+            source: 'polymarket' or 'kalshi'
+            ids: Market ids (the currently active markets)
+            fetch: Bulk fetch of the given ids, from an ISO timestamp if given
+            
+        Returns:
+            Dict of market id -> price series
+        """
+        now = time.monotonic()
+        active = set(ids)
+        cached = {}
+        with _price_cache_lock:
+            # Forget markets that are no longer active
+            for key in [key for key in _price_cache if key[0] == source and key[1] not in active]:
+                del _price_cache[key]
+            for market_id in ids:
+                entry = _price_cache.get((source, market_id))
+                if entry is not None and now - entry[0] < PRICE_CACHE_TTL and len(entry[1]):
+                    cached[market_id] = entry
+        
+        full_ids = [market_id for market_id in ids if market_id not in cached]
+        prices = fetch(full_ids, None) if full_ids else {}
+        entries = {market_id: (now, series) for market_id, series in prices.items()}
+        
+        if cached:
+            # Group markets by last cached timestamp, so one stale market
+            # doesn't drag every other market's refresh back with it; each
+            # group is fetched from its earliest last timestamp. Each market's
+            # last point is fetched again, since a candle can still change, and
+            # the fetched rows replace the cached ones from there on
+            last_ts = sorted(
+                (int(series.ts.view(np.int64)[-1]), market_id)
+                for market_id, (_, series) in cached.items()
+            )
+            groups = []
+            for ts, market_id in last_ts:
+                if not groups or ts - groups[-1][0] > PRICE_REFRESH_SLACK * 1_000_000:
+                    groups.append((ts, []))
+                groups[-1][1].append(market_id)
+            
+            new_prices = {}
+            for since, group in groups:
+                new_prices.update(fetch(group, _from_epoch_us(since, timezone.utc).isoformat()))
+            
+            for market_id, (fetched_at, series) in cached.items():
+                tail = new_prices.get(market_id)
+                if tail is not None and len(tail):
+                    keep = np.searchsorted(series.ts, tail.ts[0], side='left')
+                    series = PriceSeries(
+                        np.concatenate((series.ts[:keep], tail.ts)),
+                        np.concatenate((series.px[:keep], tail.px))
+                    )
+                prices[market_id] = series
+                entries[market_id] = (fetched_at, series)
+        
+        with _price_cache_lock:
+            for market_id, entry in entries.items():
+                _price_cache[source, market_id] = entry
+        
+        return prices
+    
+    def _fetch_polymarket_bulk(self, condition_ids: List[str], since: Optional[str] = None) -> Dict[str, PriceSeries]:
+        """Fetch price series for many Polymarket conditions (RPC, else batched queries)"""
+        arrays = self._fetch_price_arrays('get_poly_prices', condition_ids, since)
+        if arrays is not None:
+            return {cid: _series_from_arrays(*arrays.get(cid, ([], []))) for cid in condition_ids}
+        
+        return self._fetch_series_bulk(
+            'polymarket_price_history', 'timestamp, price, token_id', 'condition_id', condition_ids,
+            self._parse_polymarket_rows, not_null='price', since=since, tiebreak='token_id'
+        )
+    
+    def _fetch_kalshi_bulk(self, tickers: List[str], since: Optional[str] = None) -> Dict[str, PriceSeries]:
+        """Fetch price series for many Kalshi tickers (RPC, else batched queries)"""
+        arrays = self._fetch_price_arrays('get_kalshi_prices', tickers, since)
+        if arrays is not None:
+            return {ticker: _series_from_arrays(*arrays.get(ticker, ([], [])), cents=True) for ticker in tickers}
+        
+        return self._fetch_series_bulk(
+            'kalshi_price_history', 'timestamp, price_close, price_mean', 'ticker', tickers,
+            self._parse_kalshi_rows, since=since
+        )
+    
+    def get_polymarket_prices_bulk(self, condition_ids: List[str]) -> Dict[str, PriceSeries]:
+        """
+        Get all price data for many Polymarket conditions in batched queries.
+        Returns an empty dict on error so callers fall back to per-market fetches.
+        """
+        try:
+            return self._cached_prices_bulk('polymarket', condition_ids, self._fetch_polymarket_bulk)
+        except Exception as e:
+            logger.error(f"Error bulk fetching Polymarket prices: {e}")
+            return {}
+    
+    def get_kalshi_prices_bulk(self, tickers: List[str]) -> Dict[str, PriceSeries]:
+        """
+        Get all price data for many Kalshi tickers in batched queries.
+        Returns an empty dict on error so callers fall back to per-market fetches.
+        """
+        try:
+            return self._cached_prices_bulk('kalshi', tickers, self._fetch_kalshi_bulk)
+        except Exception as e:
+            logger.error(f"Error bulk fetching Kalshi prices: {e}")
+            return {}
+    
+    def get_polymarket_prices(self, condition_id: str) -> PriceSeries:
+        """Get all price data for a Polymarket condition (RPC, else paginated rows)"""
+        try:
+            def query(after):
+                query = self.supabase.table('polymarket_price_history')\
+                    .select('timestamp, price, token_id')\
                     .eq('condition_id', condition_id)\
-                    .not_.is_('price', 'null')\
+                    .not_.is_('price', 'null')
+                if after:
+                    # A condition's tokens can share timestamps, so token_id
+                    # breaks ties in the seek
+                    last_ts, last_token = after['timestamp'], after['token_id']
+                    query = query.or_(
+                        f'timestamp.gt."{last_ts}",'
+                        f'and(timestamp.eq."{last_ts}",token_id.gt."{last_token}")'
+                    )
+                return query\
                     .order('timestamp', desc=False)\
-                    .limit(limit)\
-                    .offset(offset)\
-                    .execute()
-                
-                if not response.data:
-                    break
-                
-                all_data.extend(response.data)
-                
-                # If we got fewer rows than limit, we've reached the end
-                if len(response.data) < limit:
-                    break
-                
-                offset += limit
-            
-            prices = []
-            for row in all_data:
-                timestamp = datetime.fromisoformat(row['timestamp'].replace('Z', '+00:00'))
-                price = float(row['price'])
-                prices.append((timestamp, price))
+                    .order('token_id', desc=False)
+            
+            arrays = self._fetch_price_arrays('get_poly_prices', [condition_id])
+            if arrays is not None:
+                prices = _series_from_arrays(*arrays.get(condition_id, ([], [])))
+            else:
+                prices = self._parse_polymarket_rows(self._stream_all(query))
             
             logger.info(f"Fetched {len(prices)} total price points for {condition_id}")
             return prices
             
         except Exception as e:
             logger.error(f"Error fetching Polymarket prices for {condition_id}: {e}")
-            return []
+            return _series_from_arrays([], [])
     
-    def get_kalshi_prices(self, ticker: str) -> List[Tuple[datetime, float]]:
-        """Get all price data for a Kalshi ticker"""
+    def get_kalshi_prices(self, ticker: str) -> PriceSeries:
+        """Get all price data for a Kalshi ticker (RPC, else paginated rows)"""
         try:
-            # Fetch all data using pagination
-            all_data = []
-            offset = 0
-            limit = 1000
-            
-            while True:
-                response = self.supabase.table('kalshi_price_history')\
+            def query(after):
+                query = self.supabase.table('kalshi_price_history')\
                     .select('timestamp, price_close, price_mean')\
-                    .eq('ticker', ticker)\
-                    .order('timestamp', desc=False)\
-                    .limit(limit)\
-                    .offset(offset)\
-                    .execute()
-                
-                if not response.data:
-                    break
-                
-                all_data.extend(response.data)
-                
-                # If we got fewer rows than limit, we've reached the end
-                if len(response.data) < limit:
-                    break
-                
-                offset += limit
-            
-            prices = []
-            for row in all_data:
-                timestamp = datetime.fromisoformat(row['timestamp'].replace('Z', '+00:00'))
-                
-                # Use price_close, fall back to price_mean
-                price = row.get('price_close') or row.get('price_mean')
-                if price is None:
-                    continue
-                
-                price = float(price)
-                
-                # Convert from cents to 0-1 scale if needed
-                if price > 1:
-                    price = price / 100.0
-                
-                prices.append((timestamp, price))
+                    .eq('ticker', ticker)
+                if after:
+                    query = query.gt('timestamp', after['timestamp'])
+                return query.order('timestamp', desc=False)
+            
+            arrays = self._fetch_price_arrays('get_kalshi_prices', [ticker])
+            if arrays is not None:
+                prices = _series_from_arrays(*arrays.get(ticker, ([], [])), cents=True)
+            else:
+                prices = self._parse_kalshi_rows(self._stream_all(query))
             
             logger.info(f"Fetched {len(prices)} total price points for {ticker}")
             return prices
             
         except Exception as e:
             logger.error(f"Error fetching Kalshi prices for {ticker}: {e}")
-            return []
+            return _series_from_arrays([], [])
+    
+    def _detect_market(
+        self,
+        source: str,
+        market_id: str,
+        prices: PriceSeries,
+        detect_trends: bool
+    ) -> Dict[str, List[Signal]]:
+        """
+        Detect alerts and trends for one market, reusing the earlier result
+        when its price history hasn't changed (any new point changes the key)
+        """
+        last_time = prices.ts[-1].item()
+        last_price = float(prices.px[-1])
+        key = (
+            source, market_id, detect_trends,
+            self.threshold, self.trend_threshold, self.trend_window_size, self.trend_stability_points,
+            len(prices), last_time, last_price
+        )
+        
+        with _detection_cache_lock:
+            cached = _detection_cache.pop(key, None)
+            if cached is not None:
+                _detection_cache[key] = cached  # Re-insert as most recently used
+                return cached
+        
+        # Detect alerts (relative changes) and, optionally, trends
+        results = self.detect_all(prices, detect_trends)
+        
+        for signal in results['alerts'] + results['trends']:
+            signal.market_id = market_id
+            signal.source = source
+            if source == 'kalshi':
+                signal.ticker = market_id
+            else:
+                signal.condition_id = market_id
+        
+        with _detection_cache_lock:
+            _detection_cache[key] = results
+            while len(_detection_cache) > DETECTION_CACHE_SIZE:
+                del _detection_cache[next(iter(_detection_cache))]
+        
+        return results
     
     def process_polymarket_market(
         self,
         condition_id: str,
-        detect_trends: bool = True
+        detect_trends: bool = True,
+        prices: Optional[PriceSeries] = None
     ) -> Dict[str, List[Signal]]:
         """
         Process a single Polymarket market
@@ -309,42 +903,31 @@ class SignalDetector:
         Args:
             condition_id: Market condition ID
             detect_trends: Whether to detect trends (default True)
+            prices: Already-fetched price data (fetched if None)
             
         Returns:
             Dict with 'alerts' and 'trends' lists
         """
         logger.info(f"Processing Polymarket condition: {condition_id}")
         
-        prices = self.get_polymarket_prices(condition_id)
+        if prices is None:
+            prices = self.get_polymarket_prices(condition_id)
         if not prices:
             logger.warning(f"No prices found for {condition_id}")
             return {'alerts': [], 'trends': []}
         
         logger.info(f"Found {len(prices)} price points")
         
-        # Detect alerts (relative changes)
-        alerts = self.detect_signals(prices)
-        for signal in alerts:
-            signal.market_id = condition_id
-            signal.source = 'polymarket'
-            signal.condition_id = condition_id
-        
-        # Detect trends
-        trends = []
-        if detect_trends:
-            trends = self.detect_trends(prices)
-            for signal in trends:
-                signal.market_id = condition_id
-                signal.source = 'polymarket'
-                signal.condition_id = condition_id
+        results = self._detect_market('polymarket', condition_id, prices, detect_trends)
         
-        logger.info(f"Detected {len(alerts)} alerts and {len(trends)} trends")
-        return {'alerts': alerts, 'trends': trends}
+        logger.info(f"Detected {len(results['alerts'])} alerts and {len(results['trends'])} trends")
+        return results
     
     def process_kalshi_market(
         self,
         ticker: str,
-        detect_trends: bool = True
+        detect_trends: bool = True,
+        prices: Optional[PriceSeries] = None
     ) -> Dict[str, List[Signal]]:
         """
         Process a single Kalshi market
@@ -352,47 +935,51 @@ class SignalDetector:
         Args:
             ticker: Market ticker
             detect_trends: Whether to detect trends (default True)
+            prices: Already-fetched price data (fetched if None)
             
         Returns:
             Dict with 'alerts' and 'trends' lists
         """
         logger.info(f"Processing Kalshi ticker: {ticker}")
         
-        prices = self.get_kalshi_prices(ticker)
+        if prices is None:
+            prices = self.get_kalshi_prices(ticker)
         if not prices:
             logger.warning(f"No prices found for {ticker}")
             return {'alerts': [], 'trends': []}
         
         logger.info(f"Found {len(prices)} price points")
         
-        # Detect alerts (relative changes)
-        alerts = self.detect_signals(prices)
-        for signal in alerts:
-            signal.market_id = ticker
-            signal.source = 'kalshi'
-            signal.ticker = ticker
+        results = self._detect_market('kalshi', ticker, prices, detect_trends)
         
-        # Detect trends
-        trends = []
-        if detect_trends:
-            trends = self.detect_trends(prices)
-            for signal in trends:
-                signal.market_id = ticker
-                signal.source = 'kalshi'
-                signal.ticker = ticker
+        logger.info(f"Detected {len(results['alerts'])} alerts and {len(results['trends'])} trends")
+        return results
+    
+    def _get_active_ids(self, table: str, id_col: str) -> List[str]:
+        """
+        Get the ids of active markets in a tracked-markets table, from the
+        cache when fetched within ACTIVE_MARKETS_TTL seconds
+        """
+        now = time.monotonic()
+        with _active_markets_lock:
+            cached = _active_markets_cache.get(table)
+            if cached is not None and now - cached[0] < ACTIVE_MARKETS_TTL:
+                return list(cached[1])
         
-        logger.info(f"Detected {len(alerts)} alerts and {len(trends)} trends")
-        return {'alerts': alerts, 'trends': trends}
+        response = self.supabase.table(table)\
+            .select(id_col)\
+            .eq('active', True)\
+            .execute()
+        
+        ids = [m[id_col] for m in response.data] if response.data else []
+        with _active_markets_lock:
+            _active_markets_cache[table] = (now, ids)
+        return list(ids)
     
     def get_active_polymarket_conditions(self) -> List[str]:
         """Get list of active Polymarket condition IDs"""
         try:
-            response = self.supabase.table('polymarket_tracked_markets')\
-                .select('condition_id')\
-                .eq('active', True)\
-                .execute()
-            
-            return [m['condition_id'] for m in response.data] if response.data else []
+            return self._get_active_ids('polymarket_tracked_markets', 'condition_id')
         except Exception as e:
             logger.error(f"Error fetching Polymarket markets: {e}")
             return []
@@ -400,12 +987,7 @@ class SignalDetector:
     def get_active_kalshi_tickers(self) -> List[str]:
         """Get list of active Kalshi tickers"""
         try:
-            response = self.supabase.table('kalshi_tracked_markets')\
-                .select('ticker')\
-                .eq('active', True)\
-                .execute()
-            
-            return [m['ticker'] for m in response.data] if response.data else []
+            return self._get_active_ids('kalshi_tracked_markets', 'ticker')
         except Exception as e:
             logger.error(f"Error fetching Kalshi markets: {e}")
             return []
@@ -428,35 +1010,43 @@ class SignalDetector:
             'kalshi': {'markets': 0, 'alerts': 0, 'trends': 0}
         }
         
-        # Process Polymarket
         poly_conditions = self.get_active_polymarket_conditions()
         logger.info(f"Found {len(poly_conditions)} Polymarket markets")
-        
-        for condition_id in poly_conditions:
-            try:
-                results = self.process_polymarket_market(condition_id, detect_trends)
-                all_signals.extend(results['alerts'])
-                all_signals.extend(results['trends'])
-                stats['polymarket']['markets'] += 1
-                stats['polymarket']['alerts'] += len(results['alerts'])
-                stats['polymarket']['trends'] += len(results['trends'])
-            except Exception as e:
-                logger.error(f"Error processing {condition_id}: {e}")
-        
-        # Process Kalshi
         kalshi_tickers = self.get_active_kalshi_tickers()
         logger.info(f"Found {len(kalshi_tickers)} Kalshi markets")
         
-        for ticker in kalshi_tickers:
-            try:
-                results = self.process_kalshi_market(ticker, detect_trends)
-                all_signals.extend(results['alerts'])
-                all_signals.extend(results['trends'])
-                stats['kalshi']['markets'] += 1
-                stats['kalshi']['alerts'] += len(results['alerts'])
-                stats['kalshi']['trends'] += len(results['trends'])
-            except Exception as e:
-                logger.error(f"Error processing {ticker}: {e}")
+        # The supabase client's httpx session is thread-safe, so markets share it
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            # Overlap the bulk price fetches for both platforms
+            poly_fetch = executor.submit(self.get_polymarket_prices_bulk, poly_conditions)
+            kalshi_fetch = executor.submit(self.get_kalshi_prices_bulk, kalshi_tickers)
+            poly_prices = poly_fetch.result()
+            kalshi_prices = kalshi_fetch.result()
+            
+            futures = [
+                ('polymarket', condition_id, executor.submit(
+                    self.process_polymarket_market, condition_id, detect_trends, poly_prices.get(condition_id)
+                ))
+                for condition_id in poly_conditions
+            ]
+            futures += [
+                ('kalshi', ticker, executor.submit(
+                    self.process_kalshi_market, ticker, detect_trends, kalshi_prices.get(ticker)
+                ))
+                for ticker in kalshi_tickers
+            ]
+            
+            # Collect in submission order so stored signals stay deterministic
+            for platform, market_id, future in futures:
+                try:
+                    results = future.result()
+                    all_signals.extend(results['alerts'])
+                    all_signals.extend(results['trends'])
+                    stats[platform]['markets'] += 1
+                    stats[platform]['alerts'] += len(results['alerts'])
+                    stats[platform]['trends'] += len(results['trends'])
+                except Exception as e:
+                    logger.error(f"Error processing {market_id}: {e}")
         
         # Store signals
         stored_count = self.store_signals(all_signals)
@@ -474,52 +1064,140 @@ class SignalDetector:
             return 0
         
         try:
-            records = []
-            for signal in signals:
+            iso = _iso_timestamps(signals)
+            
+            # Each worker builds the records for its own chunk of signals, so
+            # only the in-flight batches are ever materialized as dicts
+            chunks = [signals[i:i + UPSERT_BATCH_SIZE] for i in range(0, len(signals), UPSERT_BATCH_SIZE)]
+            
+            def store_chunk(chunk):
+                return self._upsert_signal_batch(self._signal_records(chunk, iso))
+            
+            with ThreadPoolExecutor(max_workers=UPSERT_WORKERS) as executor:
+                count = sum(executor.map(store_chunk, chunks))
+            
+            logger.info(f"Stored {count} signals")
+            return count
+            
+        except Exception as e:
+            logger.error(f"Error storing signals: {e}")
+            return 0
+    
+    def _signal_records(
+        self,
+        signals: List[Signal],
+        iso: Dict[Tuple[int, Optional[tzinfo]], str]
+    ) -> List[Dict[str, Any]]:
+        """Build the market_signals rows for a batch of signals"""
+        threshold = self.threshold
+        trend_threshold = self.trend_threshold
+        stability_points = self.trend_stability_points
+        
+        # One pass per signal: branch on the type once and build the
+        # metadata and explanation for that type directly
+        records = [None] * len(signals)
+        for i, signal in enumerate(signals):
+            prior_price = float(signal.prior_price)
+            new_price = float(signal.new_price)
+            percent_change = float(signal.percent_change)
+            direction = signal.direction
+            
+            if signal.signal_type == 'trend':
                 metadata = {
-                    'prior_timestamp': signal.prior_timestamp.isoformat(),
-                    'threshold': self.threshold if signal.signal_type == 'relative_change' else self.trend_threshold
+                    'prior_timestamp': iso[signal.prior_time_us, signal.tz],
+                    'threshold': trend_threshold,
+                    'window_size': signal.window_size,
+                    'stability_points': stability_points
                 }
-                
-                # Add trend-specific metadata
-                if signal.signal_type == 'trend':
-                    metadata['window_size'] = signal.window_size
-                    metadata['stability_points'] = self.trend_stability_points
-                
-                explanation = f"{signal.direction.capitalize()} {abs(signal.percent_change):.1%} change"
-                if signal.signal_type == 'trend':
-                    explanation = f"Sustained {signal.direction} trend: {abs(signal.percent_change):.1%} from {signal.window_size}-point baseline"
-                
-                record = {
-                    'market_id': signal.market_id,
-                    'source': signal.source,
-                    'signal_type': signal.signal_type,
-                    'timestamp': signal.timestamp.isoformat(),
-                    'direction': signal.direction,
-                    'prior_price': float(signal.prior_price),
-                    'new_price': float(signal.new_price),
-                    'price_change': float(signal.new_price - signal.prior_price),
-                    'percent_change': float(signal.percent_change),
-                    'time_window_minutes': int((signal.timestamp - signal.prior_timestamp).total_seconds() / 60),
-                    'explanation': explanation,
-                    'metadata': metadata,
-                    'ticker': signal.ticker,
-                    'condition_id': signal.condition_id
+                explanation = f"Sustained {direction} trend: {abs(percent_change):.1%} from {signal.window_size}-point baseline"
+            else:
+                metadata = {
+                    'prior_timestamp': iso[signal.prior_time_us, signal.tz],
+                    'threshold': threshold
                 }
-                records.append(record)
+                explanation = f"{direction.capitalize()} {abs(percent_change):.1%} change"
             
+            records[i] = {
+                'market_id': signal.market_id,
+                'source': signal.source,
+                'signal_type': signal.signal_type,
+                'timestamp': iso[signal.time_us, signal.tz],
+                'direction': direction,
+                'prior_price': prior_price,
+                'new_price': new_price,
+                'price_change': new_price - prior_price,
+                'percent_change': percent_change,
+                'time_window_minutes': signal.time_window_minutes,
+                'explanation': explanation,
+                'metadata': metadata,
+                'ticker': signal.ticker,
+                'condition_id': signal.condition_id
+            }
+        
+        return records
+    
+    def _upsert_signal_batch(self, records: List[Dict[str, Any]]) -> int:
+        """Upsert one batch of signal records, returning the number stored"""
+        try:
             response = self.supabase.table('market_signals')\
                 .upsert(records, on_conflict='market_id,timestamp,signal_type')\
                 .execute()
-            
-            count = len(response.data) if response.data else 0
-            logger.info(f"Stored {count} signals")
-            return count
-            
+            return len(response.data) if response.data else 0
         except Exception as e:
-            logger.error(f"Error storing signals: {e}")
+            logger.error(f"Error storing batch of {len(records)} signals: {e}")
             return 0
     
+    def _read_csv_prices(
+        self,
+        csv_path: str,
+        time_idx: int,
+        price_idx: int,
+        source: str
+    ) -> PriceSeries:
+        """
+        Load a price series from two CSV columns, parsing whole columns in
+        pandas' C code; rows with a bad timestamp or price are dropped
+        
+        Returns:
+            Prices sorted by timestamp, in the timestamps' own timezone
+        """
+        import pandas as pd
+        
+        df = pd.read_csv(csv_path, usecols=[time_idx, price_idx], dtype=str)
+        # usecols keeps file order, so locate each column by relative position
+        raw_times = df.iloc[:, int(time_idx > price_idx)]
+        raw_prices = df.iloc[:, int(price_idx > time_idx)]
+        
+        try:
+            times = pd.to_datetime(raw_times, errors='coerce', format='ISO8601')
+        except ValueError:
+            # Mixed UTC offsets can't share one tz-aware column; normalise to UTC
+            times = pd.to_datetime(raw_times, errors='coerce', format='ISO8601', utc=True)
+        px = pd.to_numeric(raw_prices, errors='coerce').to_numpy(dtype=np.float64)
+        
+        # Convert Kalshi prices if needed
+        if source == 'kalshi':
+            px = np.where(px > 1, px / 100.0, px)
+        
+        valid = times.notna().to_numpy() & ~np.isnan(px)
+        skipped = len(df) - int(valid.sum())
+        if skipped:
+            logger.warning(f"Skipping {skipped} rows with unparseable timestamp or price")
+        
+        times = times[valid]
+        px = px[valid]
+        
+        # Sort by timestamp with a stable argsort on the epoch values
+        order = np.argsort(times.astype('int64').to_numpy(), kind='stable')
+        times = times.iloc[order]
+        px = px[order]
+        
+        # Keep the column's timezone and store the instants as UTC
+        tz = times.dt.tz
+        if tz is not None:
+            times = times.dt.tz_convert(None)
+        return PriceSeries(times.to_numpy().astype('datetime64[us]'), px, tz)
+    
     def process_csv(
         self,
         csv_path: str,
@@ -543,52 +1221,40 @@ class SignalDetector:
         """
         logger.info(f"Processing CSV: {csv_path}")
         
-        # Read CSV
-        prices = []
-        with open(csv_path, 'r') as f:
-            reader = csv.DictReader(f)
-            headers = [h.strip().lower() for h in reader.fieldnames]
-            
-            # Find timestamp and price columns
-            time_col = None
-            price_col = None
-            
-            for col in headers:
-                if col in ['timestamp', 'datetime', 'time', 'date']:
-                    time_col = reader.fieldnames[headers.index(col)]
-                if col in ['price', 'price_close', 'close']:
-                    price_col = reader.fieldnames[headers.index(col)]
-            
-            if not time_col or not price_col:
-                raise ValueError(f"Could not find timestamp or price columns. Found: {reader.fieldnames}")
-            
-            logger.info(f"Using columns: {time_col}, {price_col}")
-            
-            for row in reader:
-                try:
-                    timestamp = datetime.fromisoformat(row[time_col].replace('Z', '+00:00'))
-                    price = float(row[price_col])
-                    
-                    # Convert Kalshi prices if needed
-                    if source == 'kalshi' and price > 1:
-                        price = price / 100.0
-                    
-                    prices.append((timestamp, price))
-                except (ValueError, KeyError) as e:
-                    logger.warning(f"Skipping row: {e}")
-                    continue
+        # Resolve columns from the header row
+        with open(csv_path, 'r', newline='') as f:
+            fieldnames = next(csv.reader(f), [])
+        headers = [h.strip().lower() for h in fieldnames]
+        
+        # Find timestamp and price columns
+        time_idx = None
+        price_idx = None
+        
+        for col in headers:
+            if col in ['timestamp', 'datetime', 'time', 'date']:
+                time_idx = headers.index(col)
+            if col in ['price', 'price_close', 'close']:
+                price_idx = headers.index(col)
+        
+        if time_idx is None or price_idx is None:
+            raise ValueError(f"Could not find timestamp or price columns. Found: {fieldnames}")
+        
+        logger.info(f"Using columns: {fieldnames[time_idx]}, {fieldnames[price_idx]}")
+        
+        prices = self._read_csv_prices(csv_path, time_idx, price_idx, source)
         
         if len(prices) < 2:
             logger.error("Insufficient data in CSV")
             return {'alerts': [], 'trends': []}
         
-        # Sort by timestamp
-        prices.sort(key=lambda x: x[0])
         logger.info(f"Loaded {len(prices)} price points")
         
-        # Detect alerts
-        alerts = self.detect_signals(prices)
-        for signal in alerts:
+        # Detect alerts and, optionally, trends
+        results = self.detect_all(prices, detect_trends)
+        alerts = results['alerts']
+        trends = results['trends']
+        
+        for signal in alerts + trends:
             signal.market_id = market_id
             signal.source = source
             if source == 'kalshi':
@@ -596,18 +1262,6 @@ class SignalDetector:
             else:
                 signal.condition_id = market_id
         
-        # Detect trends
-        trends = []
-        if detect_trends:
-            trends = self.detect_trends(prices)
-            for signal in trends:
-                signal.market_id = market_id
-                signal.source = source
-                if source == 'kalshi':
-                    signal.ticker = market_id
-                else:
-                    signal.condition_id = market_id
-        
         logger.info(f"Detected {len(alerts)} alerts and {len(trends)} trends")
         
         # Write output CSV
@@ -615,7 +1269,30 @@ class SignalDetector:
             output_path = csv_path.replace('.csv', '_signals.csv')
         
         all_signals = alerts + trends
-        with open(output_path, 'w', newline='') as f:
+        iso = _iso_timestamps(all_signals)
+        rows = (
+            (
+                signal.market_id,
+                signal.source,
+                signal.signal_type,
+                iso[signal.time_us, signal.tz],
+                signal.direction,
+                f"{signal.prior_price:.6f}",
+                f"{signal.new_price:.6f}",
+                f"{signal.new_price - signal.prior_price:.6f}",
+                f"{signal.percent_change:.4f}",
+                signal.time_window_minutes,
+                f"{signal.direction.capitalize()} {abs(signal.percent_change):.1%}",
+                iso[signal.prior_time_us, signal.tz],
+                signal.ticker or '',
+                signal.condition_id or '',
+                signal.window_size or ''
+            )
+            for signal in all_signals
+        )
+        
+        # Large buffer so the rows go out in few writes
+        with open(output_path, 'w', newline='', buffering=1 << 20) as f:
             writer = csv.writer(f)
             writer.writerow([
                 'market_id', 'source', 'signal_type', 'timestamp',
@@ -623,25 +1300,7 @@ class SignalDetector:
                 'percent_change', 'time_window_minutes', 'explanation',
                 'prior_timestamp', 'ticker', 'condition_id', 'window_size'
             ])
-            
-            for signal in all_signals:
-                writer.writerow([
-                    signal.market_id,
-                    signal.source,
-                    signal.signal_type,
-                    signal.timestamp.isoformat(),
-                    signal.direction,
-                    f"{signal.prior_price:.6f}",
-                    f"{signal.new_price:.6f}",
-                    f"{signal.new_price - signal.prior_price:.6f}",
-                    f"{signal.percent_change:.4f}",
-                    int((signal.timestamp - signal.prior_timestamp).total_seconds() / 60),
-                    signal.explanation if hasattr(signal, 'explanation') else f"{signal.direction.capitalize()} {abs(signal.percent_change):.1%}",
-                    signal.prior_timestamp.isoformat(),
-                    signal.ticker or '',
-                    signal.condition_id or '',
-                    signal.window_size or ''
-                ])
+            writer.writerows(rows)
         
         logger.info(f"Saved signals to {output_path}")
         return {'alerts': alerts, 'trends': trends}
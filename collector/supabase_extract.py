@@ -4,112 +4,341 @@ Export ALL rows for a given condition_id from Supabase/PostgREST
 into polymarket_prices_full.csv with format:
 Timestamp,Price
 YYYY-MM-DD HH:MM:SS,price
+
+Usage:
+    python supabase_extract.py [--condition-id ID] [--output FILE]
+                               [--page-size N] [--concurrency N]
 """
 
-import os
+import argparse
 import csv
+import gzip
+import os
+import queue
+import random
+import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import time
 import requests
-from supabase import create_client
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 load_dotenv()
 
 
-SUPABASE_URL = os.environ["SUPABASE_URL"]
-SUPABASE_SERVICE_KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 
+# Defaults, overridable by environment variables or command-line options
 CONDITION_ID = "0x05af636e0989accb08334a74f69e5368e0aa28fe498fd16a3ca991e6dc5ae2cc"
-OUTPUT_FILE = "polymarket_prices.csv"
+OUTPUT_FILE = "polymarket_prices.csv"  # A ".gz" name writes gzip-compressed CSV
 PAGE_SIZE = 1000  # Default (and max) page size for Supabase/PostgREST
+CONCURRENCY = 16  # Time ranges walked concurrently
+SHARD_QUEUE_PAGES = 4  # Pages a time range may fetch ahead of the writer
+MAX_ATTEMPTS = 8  # Tries per page before giving up on transient errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
-# Build the REST endpoint URL
-endpoint = f"{SUPABASE_URL.rstrip('/')}/rest/v1/polymarket_price_history"
-
-# Headers for Supabase REST API
-headers = {
-    "apikey": SUPABASE_SERVICE_KEY,
-    "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-    "Accept": "application/json",
-    "Range-Unit": "items",
-    # The 'Range' header will be set dynamically inside the loop
-}
-
-params = {
-    "select": "timestamp,price",
-    "condition_id": f"eq.{CONDITION_ID}",
-    "order": "timestamp.asc"
-}
-
-all_data = []
-offset = 0
+# One CSV line as PostgREST sends it. Lines are built from each row's record
+# text, where Postgres double-quotes fields containing whitespace, so the
+# timestamp always arrives quoted: "2024-03-05 12:34:56.789+00",0.5,<token_id>
+# Captured without the quotes, fractional seconds and UTC offset, and without
+# the trailing token_id
+LINE_RE = re.compile(
+    rb'^"?(\d{4}-\d\d-\d\d)[ T](\d\d:\d\d:\d\d)[^,\n]*(,[^,\n]*),[^,\n]*$',
+    re.MULTILINE
+)
 
-print("Fetching data from Supabase in pages...")
 
-while True:
-    # Calculate the range for the current page
-    start_row = offset
-    end_row = offset + PAGE_SIZE - 1
-    headers["Range"] = f"{start_row}-{end_row}"
-
-    print(f"Fetching rows {start_row} to {end_row}...")
+class PriceExporter:
+    """Exports one condition's price history from PostgREST to CSV"""
     
-    try:
-        response = requests.get(endpoint, headers=headers, params=params, timeout=60)
-
+    def __init__(self, condition_id, page_size=PAGE_SIZE, concurrency=CONCURRENCY):
+        """
+        Args:
+            condition_id: Polymarket condition to export
+            page_size: Rows per request
+            concurrency: Number of time ranges walked at once
+        """
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.endpoint = f"{SUPABASE_URL.rstrip('/')}/rest/v1/polymarket_price_history"
+        
+        # Shared session so every page reuses pooled keep-alive connections
+        # instead of paying a new TCP/TLS handshake
+        self.session = requests.Session()
+        self.session.headers.update({
+            "apikey": SUPABASE_SERVICE_KEY,
+            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
+            # Ask for CSV so pages can be written out without parsing each row
+            "Accept": "text/csv",
+            # CSV pages compress several times over; requests decodes them transparently
+            "Accept-Encoding": "gzip",
+        })
+        for prefix in ("https://", "http://"):
+            self.session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+        
+        # A condition's tokens can share timestamps, so token_id breaks ties
+        # in the keyset order
+        self.params = {
+            "select": "timestamp,price,token_id",
+            "condition_id": f"eq.{condition_id}",
+            "order": "timestamp.asc,token_id.asc",
+            "limit": page_size
+        }
+    
+    def get_with_retry(self, page_params, page_headers=None):
+        """
+        GET the endpoint, retrying rate limits, server errors and connection
+        problems with exponential backoff and jitter
+        
+        Returns:
+            The final response (which may still be an error status)
+        """
+        for attempt in range(MAX_ATTEMPTS):
+            delay = min(30, 0.25 * 2 ** attempt) + random.random() * 0.25
+            try:
+                response = self.session.get(self.endpoint, params=page_params, headers=page_headers, timeout=60)
+            except requests.exceptions.RequestException:
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == MAX_ATTEMPTS - 1:
+                    return response
+                # Rate limits say how long to wait
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = int(retry_after)
+            
+            time.sleep(delay)
+    
+    def fetch_page(self, after=None, start=None, end=None):
+        """
+        Fetch the page of rows that follows the (timestamp, token_id) key after
+        
+        Args:
+            after: Key of the last row already fetched, or None for the first page
+            start: Only rows at or after this timestamp (None for no lower bound)
+            end: Only rows before this timestamp (None for no upper bound)
+        
+        Returns:
+            (CSV lines of the page in output format, key of its last row or
+            None if the page is empty)
+        """
+        page_params = dict(self.params)
+        page_params["timestamp"] = []
+        if start:
+            page_params["timestamp"].append(f"gte.{start}")
+        if end:
+            page_params["timestamp"].append(f"lt.{end}")
+        if after:
+            # Seek past the last row instead of using an offset, so each page
+            # is an index lookup rather than a scan over all earlier rows
+            last_ts, last_token = after
+            page_params["or"] = (
+                f'(timestamp.gt."{last_ts}",'
+                f'and(timestamp.eq."{last_ts}",token_id.gt."{last_token}"))'
+            )
+        response = self.get_with_retry(page_params)
+        
         # Check for non-successful status codes
-        if response.status_code not in (200, 206):
-            # 416 means "Range Not Satisfiable," i.e., we've asked for rows that don't exist
-            if response.status_code == 416:
-                print("Reached the end of the data.")
-                break
-            # Other errors
+        if response.status_code != 200:
             raise RuntimeError(f"Failed: {response.status_code} {response.text}")
-
+        
+        # Drop the page's own header line; the last line has no newline
+        rows = response.content.partition(b"\n")[2].rstrip(b"\n")
+        if not rows:
+            return b"", None
+        
+        # The seek key comes from the last line, parsed as CSV so the
+        # timestamp loses its quotes before it goes into the next filter
+        last = next(csv.reader([rows.rpartition(b"\n")[2].decode()]))
+        after = (last[0], last[-1])
+        
+        # Unquote each timestamp, cut it down to "YYYY-MM-DD HH:MM:SS" and
+        # drop token_id in one pass over the page, keeping the wall-clock time
+        # as before
+        return LINE_RE.sub(rb"\1 \2\3", rows) + b"\n", after
+    
+    def fetch_shard(self, start, end, pages, cancelled):
+        """
+        Walk all pages of rows with timestamps in [start, end), handing each
+        page to the writer through the bounded queue pages. Blocks while the
+        queue is full, so a range never runs more than SHARD_QUEUE_PAGES
+        pages ahead of the writer
+        
+        Args:
+            start: Only rows at or after this timestamp (None for no lower bound)
+            end: Only rows before this timestamp (None for no upper bound)
+            pages: Queue that receives each page's CSV lines, then None when
+                the range is done (or the exception that stopped it)
+            cancelled: Event set by the writer to stop the walk early
+        """
+        try:
+            after = None
+            while not cancelled.is_set():
+                rows, after = self.fetch_page(after, start, end)
+                put_page(pages, rows, cancelled)
+                
+                # A short page is the last one
+                if rows.count(b"\n") < self.page_size:
+                    break
+        except Exception as e:
+            put_page(pages, e, cancelled)
+            return
+        
+        put_page(pages, None, cancelled)
+    
+    def fetch_timestamp_bound(self, direction):
+        """
+        Get the earliest ("asc") or latest ("desc") timestamp for the condition
+        
+        Returns:
+            Timestamp as a datetime, or None if the condition has no rows
+        """
+        bound_params = {
+            "select": "timestamp",
+            "condition_id": self.params["condition_id"],
+            "order": f"timestamp.{direction}",
+            "limit": 1
+        }
+        response = self.get_with_retry(bound_params, {"Accept": "application/json"})
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed: {response.status_code} {response.text}")
+        
         data = response.json()
-
-        # If no data is returned, we're done
         if not data:
-            print("No more data found.")
-            break
+            return None
+        return datetime.fromisoformat(data[0]["timestamp"].replace("Z", "+00:00"))
+    
+    def shard_bounds(self):
+        """
+        Split the condition's time span into one equal range per worker
         
-        # Add the data from this page to our master list
-        all_data.extend(data)
-        print(f"Fetched {len(data)} new rows. Total so far: {len(all_data)}")
-
-        # If the number of rows returned is less than we asked for,
-        # it means this is the last page.
-        if len(data) < PAGE_SIZE:
-            print("Reached the last page.")
-            break
+        Returns:
+            List of (start, end) timestamp strings; the first range has no
+            lower bound and the last no upper bound, so every row falls in
+            exactly one
+        """
+        first = self.fetch_timestamp_bound("asc")
+        if first is None:
+            return []
+        last = self.fetch_timestamp_bound("desc")
+        
+        step = (last - first) / self.concurrency
+        cuts = [(first + step * i).isoformat() for i in range(1, self.concurrency)] if step else []
+        return list(zip([None] + cuts, cuts + [None]))
+    
+    def export(self, output_file):
+        """
+        Write the condition's full price history to output_file. Each page
+        is appended to a temporary file as soon as it is fetched, so disk
+        writes overlap the remaining fetches; the temporary file replaces
+        output_file only once the export is complete, so a failed run never
+        leaves a partial export behind
+        
+        Returns:
+            Number of rows written
+        """
+        rows_written = 0
+        tmp_file = f"{output_file}.tmp"
+        
+        print("Fetching data from Supabase in pages...")
         
-        # Prepare for the next page
-        offset += PAGE_SIZE
+        try:
+            # Each time range is walked by keyset on its own worker, which
+            # hands its pages over a small bounded queue. This thread is the
+            # only writer: it drains the ranges in order and writes each page
+            # as soon as it arrives, while later ranges wait with at most a
+            # few pages fetched ahead
+            with open_output(tmp_file, output_file.endswith(".gz")) as f:
+                f.write(b"Timestamp,Price\n")
+                
+                bounds = self.shard_bounds()
+                queues = [queue.Queue(maxsize=SHARD_QUEUE_PAGES) for _ in bounds]
+                cancelled = threading.Event()
+                with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                    for (start, end), pages in zip(bounds, queues):
+                        executor.submit(self.fetch_shard, start, end, pages, cancelled)
+                    
+                    try:
+                        for (start, end), pages in zip(bounds, queues):
+                            count = 0
+                            while (rows := pages.get()) is not None:
+                                if isinstance(rows, Exception):
+                                    raise rows
+                                f.write(rows)
+                                count += rows.count(b"\n")
+                            rows_written += count
+                            print(f"Fetched {count} rows from {start or 'start'} to {end or 'end'}. Total so far: {rows_written}")
+                    finally:
+                        # Release workers still waiting on a full queue
+                        cancelled.set()
+            
+            os.replace(tmp_file, output_file)
+        except BaseException:
+            # Keep any earlier export intact and drop the partial one
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
         
-        # Optional: add a small delay to be polite to the API
-        # time.sleep(0.1)
+        return rows_written
 
+
+def put_page(pages, item, cancelled):
+    """Put item on the bounded queue pages, giving up once cancelled is set"""
+    while not cancelled.is_set():
+        try:
+            pages.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def open_output(path, compress):
+    """
+    Open an output file for binary writes, gzip-compressing it at the
+    fastest level if compress is set
+    """
+    if compress:
+        return gzip.open(path, "wb", compresslevel=1)
+    return open(path, "wb", buffering=1 << 20)
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Export a Polymarket condition\'s price history to CSV')
+    parser.add_argument('--condition-id', type=str,
+                       default=os.environ.get('EXTRACT_CONDITION_ID', CONDITION_ID),
+                       help='Condition to export (env: EXTRACT_CONDITION_ID)')
+    parser.add_argument('--output', type=str,
+                       default=os.environ.get('EXTRACT_OUTPUT_FILE', OUTPUT_FILE),
+                       help='Output CSV path; a .gz name writes gzip-compressed CSV (env: EXTRACT_OUTPUT_FILE)')
+    parser.add_argument('--page-size', type=int,
+                       default=int(os.environ.get('EXTRACT_PAGE_SIZE', PAGE_SIZE)),
+                       help=f'Rows per request (env: EXTRACT_PAGE_SIZE, default: {PAGE_SIZE})')
+    parser.add_argument('--concurrency', type=int,
+                       default=int(os.environ.get('EXTRACT_CONCURRENCY', CONCURRENCY)),
+                       help=f'Time ranges fetched at once (env: EXTRACT_CONCURRENCY, default: {CONCURRENCY})')
+    
+    args = parser.parse_args()
+    
+    if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+        parser.error("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
+    if args.page_size < 1 or args.concurrency < 1:
+        parser.error("--page-size and --concurrency must be positive")
+    
+    exporter = PriceExporter(args.condition_id, args.page_size, args.concurrency)
+    
+    try:
+        rows_written = exporter.export(args.output)
     except requests.exceptions.RequestException as e:
         print(f"An error occurred: {e}")
         sys.exit(1)
+    
+    print(f"✅ Exported {rows_written} rows to {args.output}")
 
 
-print(f"\nTotal rows fetched: {len(all_data)}")
-
-# Write all collected data to the CSV
-with open(OUTPUT_FILE, "w", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(["Timestamp", "Price"])
-    # Iterate over all_data, not just 'data'
-    for row in all_data:
-        ts_raw = row.get("timestamp")
-        price = row.get("price")
-        if ts_raw:
-            ts = datetime.fromisoformat(ts_raw.replace("Z", "+00:00"))
-            formatted = ts.strftime("%Y-%m-%d %H:%M:%S")
-        else:
-            formatted = ""
-        writer.writerow([formatted, price])
-
-print(f"✅ Exported {len(all_data)} rows to {OUTPUT_FILE}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Tests for supabase_extract against PostgREST's real text/csv wire format
+
+PostgREST builds each CSV line from the row's record text form, and
+Postgres quotes any field containing whitespace - so every timestamptz
+arrives as "2024-03-05 12:34:56.789+00", quotes included.
+
+Run with: python -m unittest test_supabase_extract
+"""
+
+import contextlib
+import io
+import json
+import os
+import re
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import supabase_extract
+from supabase_extract import LINE_RE, PriceExporter
+
+# A page as PostgREST sends it for select=timestamp,price,token_id
+POSTGREST_PAGE = (
+    b'timestamp,price,token_id\n'
+    b'"2024-03-05 12:34:56.789+00",0.5,21742633143463906290569050155826241533067272736897614950488156847949938836455\n'
+    b'"2024-03-05 12:35:00+00",,48331043336612883890938759509493159234755048973500640148014422747788308965732\n'
+    b'"2024-03-05 12:35:00.5+00",1e-05,48331043336612883890938759509493159234755048973500640148014422747788308965732'
+)
+
+# The keyset filter fetch_page sends after the first page, with its values unquoted
+SEEK_RE = re.compile(r'\(timestamp\.gt\."([^"]+)",and\(timestamp\.eq\."([^"]+)",token_id\.gt\."([^"]+)"\)\)')
+
+
+def pg_timestamp(ts):
+    """Render a UTC datetime the way Postgres prints a timestamptz"""
+    text = ts.strftime("%Y-%m-%d %H:%M:%S")
+    if ts.microsecond:
+        text += f".{ts.microsecond:06d}".rstrip("0")
+    return text + "+00"
+
+
+class FakeResponse:
+    """Just enough of requests.Response for PriceExporter"""
+    
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+        self.text = content.decode()
+        self.headers = {}
+    
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakePostgREST:
+    """
+    Stand-in for the exporter's requests session, serving one condition's
+    rows the way PostgREST does: ordered by (timestamp, token_id), filtered
+    by timestamp bounds and the keyset filter, CSV lines with quoted
+    timestamps. A malformed keyset filter gets a 400, as it would upstream
+    """
+    
+    def __init__(self, rows):
+        """
+        Args:
+            rows: List of (timestamp, price, token_id) with UTC datetimes
+        """
+        self.rows = sorted(rows, key=lambda row: (row[0], row[2]))
+        self.requests = []
+    
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.requests.append(params)
+        rows = self.rows
+        for bound in params.get("timestamp", []):
+            op, value = bound.split(".", 1)
+            value = datetime.fromisoformat(value)
+            rows = [row for row in rows if (row[0] >= value if op == "gte" else row[0] < value)]
+        if "or" in params:
+            match = SEEK_RE.fullmatch(params["or"])
+            if not match or match.group(1) != match.group(2):
+                return FakeResponse(400, b'{"message":"failed to parse logic tree"}')
+            last_ts = datetime.fromisoformat(match.group(1))
+            key = (last_ts, match.group(3))
+            rows = [row for row in rows if (row[0], row[2]) > key]
+        if params["order"] == "timestamp.desc":
+            rows = rows[::-1]
+        rows = rows[:params["limit"]]
+        
+        if headers and headers.get("Accept") == "application/json":
+            body = json.dumps([{"timestamp": row[0].isoformat()} for row in rows])
+            return FakeResponse(200, body.encode())
+        lines = ["timestamp,price,token_id"] + [
+            f'"{pg_timestamp(ts)}",{"" if price is None else price},{token_id}'
+            for ts, price, token_id in rows
+        ]
+        return FakeResponse(200, "\n".join(lines).encode())
+
+
+def make_exporter(rows, page_size, concurrency=1):
+    """PriceExporter whose session is a FakePostgREST over rows"""
+    with mock.patch.object(supabase_extract, "SUPABASE_URL", "http://postgrest.invalid"):
+        exporter = PriceExporter("0xabc", page_size, concurrency)
+    exporter.session = FakePostgREST(rows)
+    return exporter
+
+
+class LineFormatTest(unittest.TestCase):
+    """LINE_RE rewrites fetched lines into the Timestamp,Price output format"""
+    
+    def test_quoted_postgrest_lines(self):
+        rows = POSTGREST_PAGE.partition(b"\n")[2]
+        self.assertEqual(
+            LINE_RE.sub(rb"\1 \2\3", rows),
+            b'2024-03-05 12:34:56,0.5\n'
+            b'2024-03-05 12:35:00,\n'
+            b'2024-03-05 12:35:00,1e-05'
+        )
+
+
+
+class FetchPageTest(unittest.TestCase):
+    """fetch_page turns a quoted CSV page into output lines and a seek key"""
+    
+    def test_seek_key_is_unquoted(self):
+        rows = [
+            (datetime.fromisoformat("2024-03-05 12:34:56.789+00:00"), 0.5, "111"),
+            (datetime.fromisoformat("2024-03-05 12:35:00+00:00"), None, "222"),
+            (datetime.fromisoformat("2024-03-05 12:35:00.5+00:00"), 1e-05, "222"),
+        ]
+        exporter = make_exporter(rows, page_size=2)
+        
+        lines, after = exporter.fetch_page()
+        self.assertEqual(lines, b'2024-03-05 12:34:56,0.5\n2024-03-05 12:35:00,\n')
+        self.assertEqual(after, ("2024-03-05 12:35:00+00", "222"))
+        
+        lines, after = exporter.fetch_page(after)
+        self.assertEqual(lines, b'2024-03-05 12:35:00,1e-05\n')
+        self.assertEqual(after, ("2024-03-05 12:35:00.5+00", "222"))
+        self.assertEqual(
+            exporter.session.requests[-1]["or"],
+            '(timestamp.gt."2024-03-05 12:35:00+00",'
+            'and(timestamp.eq."2024-03-05 12:35:00+00",token_id.gt."222"))'
+        )
+        
+        self.assertEqual(exporter.fetch_page(after), (b"", None))
+
+
+
+class ExportTest(unittest.TestCase):
+    """export walks every shard by keyset and writes each row exactly once"""
+    
+    def export(self, rows, page_size, concurrency):
+        exporter = make_exporter(rows, page_size, concurrency)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "prices.csv")
+            with contextlib.redirect_stdout(io.StringIO()):
+                count = exporter.export(path)
+            with open(path, "rb") as f:
+                return count, f.read(), exporter.session
+    
+    def expected(self, rows):
+        rows = sorted(rows, key=lambda row: (row[0], row[2]))
+        return b"Timestamp,Price\n" + b"".join(
+            f'{ts:%Y-%m-%d %H:%M:%S},{"" if price is None else price}\n'.encode()
+            for ts, price, _ in rows
+        )
+    
+    def test_tied_timestamps_across_page_boundaries(self):
+        # Three tokens per timestamp, so with a page size of 2 nearly every
+        # page boundary falls between rows sharing a timestamp
+        start = datetime.fromisoformat("2024-03-05 00:00:00.25+00:00")
+        rows = [
+            (start + timedelta(minutes=minute), round(0.01 * (minute % 97) + 0.001 * token, 3), f"{token}")
+            for minute in range(40)
+            for token in (3, 1, 2)
+        ]
+        for page_size, concurrency in ((2, 1), (2, 3), (3, 4), (1000, 16)):
+            with self.subTest(page_size=page_size, concurrency=concurrency):
+                count, output, session = self.export(rows, page_size, concurrency)
+                self.assertEqual(count, len(rows))
+                self.assertEqual(output, self.expected(rows))
+    
+    def test_single_timestamp(self):
+        # All rows tie, so there is one unbounded shard walked by token_id alone
+        ts = datetime.fromisoformat("2024-03-05 12:00:00+00:00")
+        rows = [(ts, 0.5, f"{token:03d}") for token in range(7)]
+        count, output, session = self.export(rows, page_size=2, concurrency=4)
+        self.assertEqual(count, 7)
+        self.assertEqual(output, self.expected(rows))
+        # Two bound lookups, then four pages (the last one short)
+        self.assertEqual(len(session.requests), 6)
+    
+    def test_empty_condition(self):
+        count, output, session = self.export([], page_size=2, concurrency=4)
+        self.assertEqual((count, output), (0, b"Timestamp,Price\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()